@@ -0,0 +1,92 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import yaml
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import bundle
+from code_hanon import sampling
+from code_hanon.practice_session import PracticeSession
+
+CONFIG_FILENAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yml")
+
+
+def write_exercises(directory, entries, seed=0):
+    generator = random.Random(seed)
+    lines = corpus.synthetic_lines("python", 1000, seed)
+    lists = {
+        "patterns": [f"{lines[index % len(lines)]} # {index}" for index in range(entries)],
+        "words": [f"{generator.choice(corpus.IDENTIFIERS)}_{index}" for index in range(entries)],
+        "names": [f"{generator.choice(corpus.NAMES)}{index}" for index in range(entries)],
+    }
+    weighted = {}
+    for name, elements in lists.items():
+        weights = [generator.randint(1, 1000) for _ in elements]
+        weighted[name] = list(zip(elements, weights))
+        filename = os.path.join(directory, f"{name}.txt")
+        with open(filename, "w") as stream:
+            stream.write("\n".join(elements) + "\n")
+        with open(sampling.weights_filename(filename), "w") as stream:
+            stream.write("\n".join(map(str, weights)) + "\n")
+    bundle.write_bundle(directory, weighted["patterns"], weighted["words"], weighted["names"])
+
+
+def practice_config():
+    with open(CONFIG_FILENAME) as stream:
+        return yaml.safe_load(stream)['practice']
+
+
+def measure(directory, config, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session = PracticeSession(directory, config)
+        for _ in range(config['count']):
+            session.generate_challenge()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='compare the practice startup time with and without a bundle')
+    options.add_argument('-e', '--entries', default=300000, type=int, action='store')
+    options.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    options.add_argument('-s', '--sessions', default=20, type=int, action='store')
+    options.add_argument('-a', '--adaptive', default=0.5, type=float, action='store')
+    args = options.parse_args(argv)
+
+    config = dict(practice_config(), adaptive=args.adaptive)
+    with tempfile.TemporaryDirectory() as directory:
+        corpus.write_statistics_database(os.path.join(directory, "statistics.db"), args.sessions, 200)
+        write_exercises(directory, args.entries)
+        bundle_time = measure(directory, config, args.repeat)
+        os.remove(os.path.join(directory, bundle.BUNDLE_FILENAME))
+        text_time = measure(directory, config, args.repeat)
+
+    rows = [[
+        args.entries, "%.1f" % (text_time * 1000), "%.1f" % (bundle_time * 1000), "%.1fx" % (text_time / bundle_time)
+    ]]
+    print(tabulate(rows, headers=["Entries per list", "Text files (ms)", "Bundle (ms)", "Speedup"]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
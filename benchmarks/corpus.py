@@ -0,0 +1,155 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import random
+import string
+from code_hanon import languages
+from code_hanon import statistics_repository
+from code_hanon.practice_session import Challenge
+from code_hanon.session_statistics import SessionStatistics
+from code_hanon.trace import TraceWriter
+
+BASE_TIMESTAMP = 1700000000
+
+IDENTIFIERS = ["value", "index", "result", "count", "items", "buffer", "payload", "stream", "total", "offset"]
+NAMES = ["Parser", "HttpClient", "Session", "TokenStream", "Buffer", "Config", "ErrorCode", "NodeList"]
+LINE_TEMPLATES = {
+    "python": [
+        "def {w}(self, {w}, {w}={d}):",
+        "    return self.{w}[{d}:{w}]",
+        "    {w} = {N}({w}, '{w} {w}')",
+        "    for {w} in range({d}, len({w})):",
+        "        if {w} is None and not {w}:",
+        "            raise {N}(\"{w} {w}\")",
+        "class {N}({N}):",
+        "    # {w} {w} {w}",
+        "from {w}.{w} import {N}",
+        "    {w}.{w}({w}, {w}={w})",
+    ],
+    "ruby": [
+        "def {w}({w}, {w} = {d})",
+        "  @{w} = {N}.new({w}, '{w}')",
+        "  {w}.each do |{w}|",
+        "    expect({w}).to eq({d})",
+        "  return {w} if {w}.nil?",
+        "class {N} < {N}",
+        "  # {w} {w} {w}",
+        "require '{w}/{w}'",
+        "end",
+    ],
+    "c": [
+        "static int {w}(const {N} *{w}, size_t {w}) {{",
+        "    for (int {w} = {d}; {w} < {w}; {w}++) {{",
+        "    {w}[{w}] = {w}->{w} + {d};",
+        "    if ({w} == NULL) return -{d};",
+        "    /* {w} {w} {w} */",
+        "    {w}({w}, \"{w} %d\\n\", {w}); // {w}",
+        "#include <{w}.h>",
+        "#define {N} {d}",
+        "}}",
+    ],
+}
+
+
+def synthetic_lines(language, count, seed=0):
+    generator = random.Random(seed)
+    templates = LINE_TEMPLATES[language]
+    lines = []
+    for _ in range(count):
+        template = generator.choice(templates)
+        lines.append(_fill(template, generator))
+    return lines
+
+
+def synthetic_source(language, count, seed=0):
+    return "\n".join(synthetic_lines(language, count, seed)) + "\n"
+
+
+def write_source_tree(directory, language, files, lines, seed=0):
+    extension = languages.supported[language]["extensions"][0].lstrip("*")
+    for index in range(files):
+        package = os.path.join(directory, f"package{index % 10}")
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"module{index}{extension}"), "w") as stream:
+            stream.write(synthetic_source(language, lines, seed + index))
+
+
+def write_statistics_database(filename, sessions, challenges, seed=0):
+    statistics_repository.DATABASE_FILENAME = filename
+    statistics_repository.prepare()
+    for session in range(sessions):
+        language = sorted(LINE_TEMPLATES)[session % len(LINE_TEMPLATES)]
+        writer = statistics_repository.StatisticsWriter(BASE_TIMESTAMP + session * 3600)
+        writer.start()
+        writer.write(synthetic_session(language, challenges, error_rate=0.1, seed=seed + session))
+        writer.finish()
+
+
+def write_synthetic_traces(filename, sessions, challenges, error_rate=0.05, seed=0):
+    with open(filename, "w") as stream:
+        trace = TraceWriter(stream)
+        for session in range(sessions):
+            generator = random.Random(seed + session)
+            templates = LINE_TEMPLATES[sorted(LINE_TEMPLATES)[session % len(LINE_TEMPLATES)]]
+            trace.session(BASE_TIMESTAMP + session * 3600)
+            timestamp = 0
+            for _ in range(challenges):
+                template = generator.choice(templates)
+                challenge = _fill(template, generator).strip()
+                trace.challenge(Challenge(_abstract(template).strip(), challenge, challenge))
+                for pos, char in enumerate(challenge):
+                    if pos > 0 and generator.random() < error_rate:
+                        timestamp += generator.randint(50, 400) * 1000000
+                        trace.key("~" if char != "~" else "!", timestamp)
+                        timestamp += generator.randint(100, 300) * 1000000
+                        trace.key("\x7f", timestamp)
+                    timestamp += generator.randint(50, 400) * 1000000
+                    trace.key(char, timestamp)
+
+
+def _abstract(template):
+    return template.format(w="W", N="N", d="1")
+
+
+def _fill(template, generator):
+    line = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        line += literal
+        if field == "w":
+            line += generator.choice(IDENTIFIERS) + generator.choice(["", "_" + generator.choice(IDENTIFIERS)])
+        elif field == "N":
+            line += generator.choice(NAMES)
+        elif field == "d":
+            line += str(generator.randint(0, 4096))
+    return line
+
+
+def synthetic_session(language, challenges, error_rate=0.05, seed=0, factory=SessionStatistics):
+    generator = random.Random(seed)
+    templates = LINE_TEMPLATES[language]
+    statistics = factory()
+    timestamp = 0
+    for _ in range(challenges):
+        template = generator.choice(templates)
+        challenge = _fill(template, generator).strip()
+        statistics.start(_abstract(template).strip(), challenge)
+        for pos in range(len(challenge)):
+            timestamp += generator.randint(50, 400) * 1000000
+            if pos > 0 and generator.random() < error_rate:
+                statistics.invalid_input(pos, timestamp)
+            statistics.valid_input(pos, timestamp)
+        statistics.challenge_end()
+    return statistics
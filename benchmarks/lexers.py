@@ -0,0 +1,86 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import re
+import sys
+import time
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import analyzer
+from code_hanon import languages
+from code_hanon.lexers import Lexer
+
+LEGACY_COMMENTS = {
+    "c": r'//.*?$|/\*.*?\*/|\'(?:\\.|[^\\\'])*\'|"(?:\\.|[^\\"])*"'
+}
+
+
+def legacy_remove_comments(text, language):
+    def replacer(match):
+        token = match.group(0)
+        return " " if token.startswith('/') else token
+
+    regex = re.compile(LEGACY_COMMENTS[language], re.DOTALL | re.MULTILINE)
+    return regex.sub(replacer, text)
+
+
+def lex(text, language):
+    lexer = Lexer(language)
+    output = []
+    for start in range(0, len(text), analyzer.CHUNK_SIZE):
+        output.append(lexer.feed(text[start:start + analyzer.CHUNK_SIZE]))
+    output.append(lexer.feed("", final=True))
+    return "".join(output)
+
+
+def measure(function, text, language, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(text, language)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='measure the throughput of the lexer of each language')
+    options.add_argument('-n', '--lines', default=200000, type=int, action='store')
+    options.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    args = options.parse_args(argv)
+
+    rows = []
+    for language in languages.supported:
+        text = corpus.synthetic_source(language, args.lines)
+        megabytes = len(text.encode()) / (1 << 20)
+        elapsed, output = measure(lex, text, language, args.repeat)
+        legacy = "-"
+        if language in LEGACY_COMMENTS:
+            legacy_elapsed, legacy_output = measure(legacy_remove_comments, text, language, args.repeat)
+            legacy = "%.1f" % (megabytes / legacy_elapsed)
+        rows.append([
+            language,
+            "%.1f" % megabytes,
+            legacy,
+            "%.1f" % (megabytes / elapsed),
+            "%d" % (args.lines / elapsed),
+            "%.1f %%" % (100 - len(output) * 100 / len(text)),
+        ])
+    print(tabulate(rows, headers=["Language", "Source (MB)", "Legacy (MB/s)", "Lexer (MB/s)", "Lines/s", "Removed"]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,63 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import replay
+from code_hanon import statistics_repository
+from code_hanon import trace
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='replay synthetic practice sessions into a statistics database')
+    options.add_argument('-s', '--sessions', default=200, type=int, action='store')
+    options.add_argument('-c', '--challenges', default=25, type=int, action='store')
+    options.add_argument('-e', '--error-rate', default=0.05, type=float, action='store')
+    options.add_argument('-t', '--trace', default=None, action='store', help="keep the synthetic trace in this file")
+    args = options.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace_filename = args.trace or os.path.join(directory, "trace.jsonl")
+        corpus.write_synthetic_traces(trace_filename, args.sessions, args.challenges, args.error_rate)
+        statistics_repository.DATABASE_FILENAME = os.path.join(directory, "statistics.db")
+        statistics_repository.prepare()
+
+        keystrokes = 0
+        start = time.perf_counter()
+        with open(trace_filename) as stream:
+            for recorded_session in trace.read_sessions(stream):
+                replay.replay_session(recorded_session)
+                keystrokes += len(recorded_session.keys)
+        elapsed = time.perf_counter() - start
+
+        connection = sqlite3.connect(statistics_repository.DATABASE_FILENAME)
+        rows = sum(connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ["ngrams", "latencies"])
+        connection.close()
+        size = os.path.getsize(statistics_repository.DATABASE_FILENAME)
+
+    print(tabulate([[
+        args.sessions, keystrokes, "%.2f" % elapsed, "%.1f" % (args.sessions / elapsed),
+        "%.1f" % (elapsed * 1000000 / keystrokes), rows, "%.1f" % (size / (1 << 20))
+    ]], headers=["Sessions", "Keystrokes", "Time (s)", "Sessions/s", "µs/keystroke", "Rows", "Database (MB)"]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon.session_statistics import SessionStatistics
+
+
+class LegacySessionStatistics:
+    def __init__(self):
+        self.valid_strokes = 0
+        self.invalid_strokes = 0
+        self.before = 0
+        self.ok_chars = []
+        self.latency_per_char = []
+        self.failed_3grams = Counter()
+        self.valid_3grams = Counter()
+        self.latency_3grams = []
+        self.challenge_string = None
+        self.generator_pattern = None
+
+    def start(self, generator_pattern, challenge_string):
+        self.challenge_string = challenge_string
+        self.generator_pattern = generator_pattern
+        self.ok_chars = [None] * len(challenge_string)
+        self.latency_per_char = [0] * len(challenge_string)
+
+    def valid_input(self, pos, timestamp):
+        if pos == 0:
+            self.before = timestamp
+            return
+        self.latency_per_char[pos] = (timestamp - self.before) / 1e9
+        self.before = timestamp
+        self.valid_strokes += 1
+        if self.ok_chars[pos] is None:
+            self.ok_chars[pos] = True
+        if self.ok_at(pos - 2) and self.ok_at(pos - 1) and self.ok_at(pos):
+            self.valid_3grams[self.ngram_key(pos)] += 1
+            self.latency_3grams.append([self.ngram_key(pos), int(self.latency_per_char[pos] * 1000)])
+
+    def invalid_input(self, pos, timestamp):
+        self.before = timestamp
+        self.invalid_strokes += 1
+        if self.ok_chars[pos] is None:
+            self.ok_chars[pos] = False
+        if self.ok_at(pos - 2) and self.ok_at(pos - 1):
+            self.failed_3grams[self.ngram_key(pos)] += 1
+
+    def ngram_key(self, pos):
+        return tuple([tuple([self.at(pos - 2), self.at(pos - 1), self.at(pos)]), self.generator_pattern])
+
+    def ok_at(self, pos):
+        return self.ok_chars[pos] if pos > 0 else True
+
+    def at(self, pos):
+        return self.challenge_string[pos] if pos > 0 else "$"
+
+    def challenge_end(self):
+        pass
+
+
+def measure(factory, challenges):
+    gc.collect()
+    start = time.perf_counter()
+    statistics = corpus.synthetic_session("python", challenges, factory=factory)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    statistics = corpus.synthetic_session("python", challenges, factory=factory)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    keystrokes = statistics.valid_strokes + statistics.invalid_strokes
+    return elapsed, retained / keystrokes, peak / keystrokes
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='compare the memory used per keystroke by the session statistics')
+    options.add_argument('-c', '--challenges', default=10000, type=int, action='store')
+    args = options.parse_args(argv)
+
+    rows = []
+    for name, factory in [("Legacy", LegacySessionStatistics), ("Current", SessionStatistics)]:
+        elapsed, retained, peak = measure(factory, args.challenges)
+        rows.append([name, "%.3f" % elapsed, "%.1f" % retained, "%.1f" % peak])
+    print(tabulate(rows, headers=["Statistics", "Session time (s)", "Retained bytes/key", "Peak bytes/key"]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,90 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from tabulate import tabulate
+
+HANON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hanon.py")
+COMMANDS = [
+    ["help"],
+    ["stats", "--help"],
+    ["compact", "--help"],
+    ["analyze", "--help"],
+    ["practice", "--help"],
+    ["replay", "--help"],
+]
+LAZY_MODULES = ["yaml", "tabulate", "sparklines", "termcolor", "termios", "numpy", "code_hanon.analyzer"]
+CONFIGURED_COMMANDS = ["practice"]
+
+
+def imported_modules(command):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", HANON] + command,
+        capture_output=True, text=True, cwd=os.path.dirname(HANON)
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if fields[0].strip().isdigit():
+            modules[fields[2].strip()] = int(fields[0])
+    return modules
+
+
+def wall_time(command, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, HANON] + command, capture_output=True, cwd=os.path.dirname(HANON))
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='check the startup time of the hanon commands')
+    options.add_argument('-r', '--repeat', default=5, type=int, action='store')
+    options.add_argument('-t', '--target', default=100, type=float, action='store',
+                         help="maximum startup time in milliseconds of `hanon help`")
+    args = options.parse_args(argv)
+
+    rows = []
+    errors = []
+    for command in COMMANDS:
+        modules = imported_modules(command)
+        milliseconds = wall_time(command, args.repeat) * 1000
+        rows.append([" ".join(command), "%.1f" % milliseconds, "%.1f" % (sum(modules.values()) / 1000), len(modules)])
+        unexpected = [
+            module for module in LAZY_MODULES
+            if module in modules and not (module == "yaml" and command[0] in CONFIGURED_COMMANDS)
+        ]
+        if unexpected:
+            errors.append(f"`{' '.join(command)}` imports {', '.join(unexpected)}")
+        if command == ["help"] and milliseconds > args.target:
+            errors.append(f"`help` took {milliseconds:.1f}ms, over the {args.target:.0f}ms target")
+    print(tabulate(rows, headers=["Command", "Wall (ms)", "Imports (ms)", "Modules"]))
+
+    for error in errors:
+        print(f"error: {error}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
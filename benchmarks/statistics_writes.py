@@ -0,0 +1,101 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import statistics_repository
+
+
+def legacy_update_statistics(statistics):
+    connection = sqlite3.connect(statistics_repository.DATABASE_FILENAME)
+    cursor = connection.cursor()
+    for ngram in statistics.failed_3grams.most_common():
+        _legacy_insert(cursor, ngram, statistics_repository.FAILED)
+    for ngram in statistics.valid_3grams.most_common():
+        _legacy_insert(cursor, ngram, statistics_repository.VALID)
+    for latency in statistics.latency_3grams:
+        _legacy_insert_latency(cursor, latency)
+    connection.commit()
+    connection.close()
+
+
+def _legacy_insert(cursor, element, status):
+    ngram_id = "".join(element[0][0])
+    if ngram_id.startswith("$$"):
+        return
+    cursor.execute(
+        f"INSERT INTO ngrams (ngram, pattern, status, value, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [ngram_id, element[0][1], status, element[1], int(time.time())]
+    )
+
+
+def _legacy_insert_latency(cursor, latency):
+    ngram_id = "".join(latency[0][0])
+    if ngram_id.startswith("$$"):
+        return
+    cursor.execute(
+        f"INSERT INTO latencies (ngram, pattern, value, timestamp) VALUES (?, ?, ?, ?)",
+        [ngram_id, latency[0][1], latency[1], int(time.time())]
+    )
+
+
+def measure(function, statistics, repeat):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            statistics_repository.DATABASE_FILENAME = os.path.join(directory, "statistics.db")
+            statistics_repository.prepare()
+            start = time.perf_counter()
+            function(statistics)
+            elapsed = time.perf_counter() - start
+            rows = _count_rows()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def _count_rows():
+    connection = sqlite3.connect(statistics_repository.DATABASE_FILENAME)
+    rows = [connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ["ngrams", "latencies"]]
+    connection.close()
+    return rows
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='compare the legacy per row statistics writes with the batched ones')
+    options.add_argument('-c', '--challenges', default=10000, type=int, action='store')
+    options.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    args = options.parse_args(argv)
+
+    statistics = corpus.synthetic_session("python", args.challenges)
+    legacy_time, legacy_rows = measure(legacy_update_statistics, statistics, args.repeat)
+    current_time, current_rows = measure(statistics_repository.update_statistics, statistics, args.repeat)
+    if legacy_rows != current_rows:
+        print(f"error: writers disagree, {legacy_rows} rows against {current_rows}")
+        sys.exit(1)
+    print(tabulate(
+        [[args.challenges, sum(current_rows), "%.3f" % legacy_time, "%.3f" % current_time,
+          "%.2fx" % (legacy_time / current_time)]],
+        headers=["Challenges", "Rows", "Legacy (s)", "Batched (s)", "Speedup"]
+    ))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
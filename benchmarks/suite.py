@@ -0,0 +1,136 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import analyzer
+from code_hanon import languages
+from code_hanon import statistics_presenter
+from code_hanon import statistics_repository
+from code_hanon.practice_session import PracticeSession
+
+PRACTICE_CONFIG = {'count': 20, 'press_enter': True, 'repeat_failures': 0}
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+    return {'best': min(durations), 'median': statistics.median(durations), 'repeat': repeat}
+
+
+def run(args, directory):
+    results = {}
+    for language in languages.supported:
+        sources = os.path.join(directory, "sources", language)
+        exercises = os.path.join(directory, "exercises", language)
+        corpus.write_source_tree(sources, language, args.files, args.lines)
+        results[f"analyze.{language}"] = timed(
+            lambda: analyzer.analyze(language, [sources], exercises, cache=False), args.repeat
+        )
+
+        session = PracticeSession(exercises, PRACTICE_CONFIG)
+        random.seed(0)
+        results[f"generate_challenge.{language}"] = timed(
+            lambda: [session.generate_challenge() for _ in range(args.generated)], args.repeat
+        )
+
+    corpus.write_statistics_database(os.path.join(directory, "statistics.db"), args.sessions, args.challenges)
+    session_statistics = corpus.synthetic_session("python", args.challenges)
+    results["update_statistics"] = timed(
+        lambda: statistics_repository.update_statistics(session_statistics), args.repeat
+    )
+    results["all_statistics"] = timed(statistics_repository.all_statistics, args.repeat)
+    for sort in statistics_repository.SORT_COLUMNS:
+        results[f"present.{sort}"] = timed(lambda: statistics_presenter.present(sort), args.repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            rows.append([name, "%.4f" % result['best'], "-", "-", ""])
+            continue
+        ratio = result['best'] / previous['best']
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        if flag:
+            regressions.append(name)
+        rows.append([name, "%.4f" % result['best'], "%.4f" % previous['best'], "%.2fx" % ratio, flag])
+    print(tabulate(rows, headers=["Benchmark", "Best (s)", "Baseline (s)", "Ratio", ""]))
+    return regressions
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='time the analyzer, challenge generation and statistics')
+    options.add_argument('-f', '--files', default=200, type=int, action='store')
+    options.add_argument('-n', '--lines', default=200, type=int, action='store')
+    options.add_argument('-s', '--sessions', default=50, type=int, action='store')
+    options.add_argument('-c', '--challenges', default=200, type=int, action='store')
+    options.add_argument('-g', '--generated', default=100000, type=int, action='store')
+    options.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    options.add_argument('-o', '--output', default=None, action='store', help="write the results to this JSON file")
+    options.add_argument('--compare', default=None, action='store', help="JSON results of a previous run")
+    options.add_argument('--threshold', default=0.1, type=float, action='store',
+                         help="flag benchmarks slower than the baseline by more than this fraction")
+    args = options.parse_args(argv)
+
+    database_filename = statistics_repository.DATABASE_FILENAME
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            results = run(args, directory)
+        finally:
+            statistics_repository.DATABASE_FILENAME = database_filename
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ['output', 'compare']},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(report, stream, indent=2)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            regressions = compare(results, json.load(stream), args.threshold)
+        if regressions:
+            print(f"error: {len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(tabulate(
+            [[name, "%.4f" % result['best'], "%.4f" % result['median']] for name, result in results.items()],
+            headers=["Benchmark", "Best (s)", "Median (s)"]
+        ))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
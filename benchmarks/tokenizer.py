@@ -0,0 +1,84 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import re
+import sys
+import time
+from itertools import groupby
+from tabulate import tabulate
+from benchmarks import corpus
+from code_hanon import analyzer
+from code_hanon import languages
+
+
+def legacy_analyze_text(text, analysis):
+    for line in text.split('\n'):
+        compressed_line = line.strip()
+        compressed_line = re.sub(r'([A-Z]\w+)+', lambda x: _legacy_replace(x, analysis.names), compressed_line)
+        compressed_line = re.sub(
+            r'[a-z_]\w+',
+            lambda x: x.group() if x.group() in analysis.reserved_words else _legacy_replace(x, analysis.words, "W"),
+            compressed_line
+        )
+        compressed_line = re.sub(r"\'[\w \t]*\'", "'W'", compressed_line)
+        compressed_line = re.sub(r'\d', "1", compressed_line)
+        compressed_line = "".join([key for key, _group in groupby(compressed_line)])
+        compressed_line = compressed_line.replace("clas", "class")
+        if not all(char in ["a", " ", "\t", "\n"] for char in compressed_line) and len(compressed_line) > 3:
+            analysis.patterns[compressed_line] += 1
+
+
+def _legacy_replace(match, counter, replacement="N"):
+    counter[match.group()] += 1
+    return replacement
+
+
+def measure(function, text, language, repeat):
+    best = None
+    for _ in range(repeat):
+        analysis = analyzer.Analysis(language)
+        start = time.perf_counter()
+        function(text, analysis)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, analysis
+
+
+def main(argv):
+    options = argparse.ArgumentParser(description='compare the legacy per line tokenizer with the current one')
+    options.add_argument('-n', '--lines', default=200000, type=int, action='store')
+    options.add_argument('-r', '--repeat', default=3, type=int, action='store')
+    args = options.parse_args(argv)
+
+    rows = []
+    for language in languages.supported:
+        text = corpus.synthetic_source(language, args.lines)
+        legacy_time, legacy = measure(legacy_analyze_text, text, language, args.repeat)
+        current_time, current = measure(analyzer._analyze_text, text, language, args.repeat)
+        if (legacy.patterns, legacy.words, legacy.names) != (current.patterns, current.words, current.names):
+            print(f"error: tokenizers disagree for {language}")
+            sys.exit(1)
+        rows.append([
+            language,
+            "%d" % (args.lines / legacy_time),
+            "%d" % (args.lines / current_time),
+            "%.2fx" % (legacy_time / current_time),
+        ])
+    print(tabulate(rows, headers=["Language", "Legacy (lines/s)", "Current (lines/s)", "Speedup"]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
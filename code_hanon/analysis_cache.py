@@ -0,0 +1,69 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+
+CACHE_FILENAME = ".analysis.cache"
+CACHE_VERSION = 2
+
+CachedFile = namedtuple('CachedFile', ['size', 'mtime_ns', 'digest', 'patterns', 'words', 'names'])
+
+
+class AnalysisCache:
+    def __init__(self, filename, language, files=None):
+        self.filename = filename
+        self.language = language
+        self.files = files or {}
+        self.visited_files = {}
+
+    @classmethod
+    def load(cls, output, language):
+        filename = os.path.join(output, CACHE_FILENAME)
+        try:
+            with open(filename, "rb") as stream:
+                version, cached_language, files = pickle.load(stream)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return cls(filename, language)
+        if version != CACHE_VERSION or cached_language != language:
+            return cls(filename, language)
+        return cls(filename, language, files)
+
+    def signature(self, path):
+        cached_file = self.files.get(path)
+        return cached_file[:3] if cached_file else None
+
+    def visit(self, path, cached_file):
+        self.visited_files[path] = cached_file
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        temporary_filename = f"{self.filename}.tmp"
+        with open(temporary_filename, "wb") as stream:
+            pickle.dump((CACHE_VERSION, self.language, self.visited_files), stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_filename, self.filename)
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_digest(stream, chunk_size):
+    digest = new_digest()
+    while chunk := stream.read(chunk_size):
+        digest.update(chunk)
+    return digest.digest()
@@ -13,107 +13,256 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import codecs
+import io
+import locale
 import os
-from pathlib import Path
 from collections import Counter
 import re
+from time import perf_counter
+from multiprocessing import Pool
 from tabulate import tabulate
-from itertools import groupby
+from itertools import islice
+from code_hanon import bundle
+from code_hanon import discovery
 from code_hanon import languages
+from code_hanon import lexers
+from code_hanon import profiling
+from code_hanon import sampling
+from code_hanon import shards
+from code_hanon.heavy_hitters import SpaceSaving
+from code_hanon.profiling import Profile
+from code_hanon.analysis_cache import AnalysisCache, CachedFile, file_digest, new_digest
 import functools
 
+FILES_PER_JOB = 32
+CHUNK_SIZE = 1 << 20
+NAME_REGEX = re.compile(r'([A-Z]\w+)')
+QUOTED_REGEX = re.compile(r"'[\w \t]*'")
+DIGIT_REGEX = re.compile(r'\d')
+REPEATED_CHARACTER_REGEX = re.compile(r'(.)\1+')
+PRESENTED_LISTS = [("patterns", 25), ("words", 100), ("names", 100)]
+
 
 class Analysis:
-    def __init__(self, language):
+    def __init__(self, language, max_entries=None, profile=None):
         self.patterns = Counter()
-        self.words = Counter()
-        self.names = Counter()
+        self.words = SpaceSaving(max_entries) if max_entries else Counter()
+        self.names = SpaceSaving(max_entries) if max_entries else Counter()
         self.extensions = languages.supported[language]["extensions"]
-        self.reserved_words = languages.supported[language]["reserved_words"]
+        self.reserved_words = frozenset(languages.supported[language]["reserved_words"])
+        self.profile = profile
+
+    def merge(self, other):
+        self.patterns.update(other.patterns)
+        self.words.update(other.words)
+        self.names.update(other.names)
+        if self.profile is not None and getattr(other, "profile", None) is not None:
+            self.profile.merge(other.profile)
 
 
-def analyze(language, directories, output):
+def analyze(
+    language, directories, output, jobs=1, excluded=(), gitignore=False, cache=True, max_entries=None, profile=None,
+    bundle_size=None, shard=None
+):
     print(f'Analyzing {language} files from {", ".join(directories)}')
 
-    analysis = Analysis(language)
-    for directory in directories:
-        files = functools.reduce(lambda v, e: v + list(Path(directory).rglob(e)), analysis.extensions, [])
-        for path in files:
-            try:
-                with open(path, 'r', errors='ignore') as stream:
-                    payload = stream.read()
-                _analyze(payload, language, analysis)
-            except UnicodeError as error:
-                print(f"error while decoding file `{path}`")
-    _present(analysis, output)
-
-
-def _analyze(payload, language, analysis):
-    payload = _remove_comments(payload, language)
-    lines = payload.split('\n')
-    for line in lines:
-        compressed_line = line.strip()
-        compressed_line = re.sub(r'([A-Z]\w+)+', lambda x: _replace_name(x, analysis), compressed_line)
-        compressed_line = re.sub(r'[a-z_]\w+', lambda x: _replace_word(x, analysis), compressed_line)
-        compressed_line = re.sub(r"\'[\w \t]*\'", "'W'", compressed_line)
-        compressed_line = re.sub(r'\d', "1", compressed_line)
-        compressed_line = "".join([key for key, _group in groupby(compressed_line)])
-        compressed_line = compressed_line.replace("clas", "class")
+    analysis = Analysis(language, max_entries, profile)
+    cache = cache and not max_entries
+    profiled = profile is not None
+    skipped = discovery.SKIPPED_DIRECTORIES + list(excluded)
+    files = profiling.timed_iterable(profile, "discovery", (
+        path
+        for directory in directories
+        for path in discovery.discover(directory, analysis.extensions, skipped, gitignore)
+    ))
+    if cache:
+        with profiling.phase(profile, "cache"):
+            file_cache = AnalysisCache.load(shard or output, language)
+        partial_analyses = _analyze_incrementally(files, language, jobs, file_cache, profile)
+    else:
+        partial_analyses = _map(
+            functools.partial(_analyze_files, language, profiled), _batches(files, FILES_PER_JOB), jobs
+        )
+    for partial_analysis in partial_analyses:
+        with profiling.phase(profile, "merge"):
+            analysis.merge(partial_analysis)
+    with profiling.phase(profile, "present"):
+        if shard:
+            shards.write_shard(shard, language, analysis)
+        else:
+            _present(analysis, output, bundle_size)
+    if cache:
+        with profiling.phase(profile, "cache"):
+            file_cache.save()
 
-        if _syntax_relevant(compressed_line):
-            analysis.patterns[compressed_line] += 1
 
+def _map(function, iterable, jobs):
+    if jobs > 1:
+        with Pool(jobs) as pool:
+            yield from pool.imap(function, iterable)
+    else:
+        yield from map(function, iterable)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _analyze_files(language, profiled, paths):
+    analysis = Analysis(language, profile=Profile() if profiled else None)
+    for path in paths:
+        _analyze_file(path, language, analysis)
+    return analysis
+
+
+def _analyze_incrementally(files, language, jobs, file_cache, profile=None):
+    signatures = ((path, file_cache.signature(path)) for path in map(os.path.abspath, files))
+    analyzed_batches = _map(
+        functools.partial(_analyze_cached_files, language, profile is not None),
+        _batches(signatures, FILES_PER_JOB),
+        jobs
+    )
+    for batch in analyzed_batches:
+        for path, size, mtime_ns, digest, file_analysis, file_profile in batch:
+            if profile is not None:
+                profile.merge(file_profile)
+            if file_analysis is None:
+                file_analysis = file_cache.files[path]
+            cached_file = CachedFile(size, mtime_ns, digest, file_analysis.patterns, file_analysis.words, file_analysis.names)
+            file_cache.visit(path, cached_file)
+            yield cached_file
+
+
+def _analyze_cached_files(language, profiled, files):
+    return [(path, *_analyze_cached_file(path, signature, language, profiled)) for path, signature in files]
 
-def _remove_comments(payload, language):
-    def replacer(match):
-        s = match.group(0)
-        if s.startswith('/'):
-            return " "
-        else:
-            return s
 
-    lang = languages.supported[language]
-    if "comments" not in lang:
-        return payload
+def _analyze_cached_file(path, signature, language, profiled=False):
+    analysis = Analysis(language, profile=Profile() if profiled else None)
+    with open(path, 'rb') as stream:
+        stat = os.fstat(stream.fileno())
+        if signature is not None:
+            size, mtime_ns, cached_digest = signature
+            with profiling.phase(analysis.profile, "cache"):
+                unchanged = (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns)
+                unchanged = unchanged or file_digest(stream, CHUNK_SIZE) == cached_digest
+            if unchanged:
+                return stat.st_size, stat.st_mtime_ns, cached_digest, None, analysis.profile
+            stream.seek(0)
+        digest = new_digest()
+        _analyze_file_stream(path, stream, language, analysis, digest)
+    profile, analysis.profile = analysis.profile, None
+    return stat.st_size, stat.st_mtime_ns, digest.digest(), analysis, profile
 
-    pattern = re.compile(lang["comments"], re.DOTALL | re.MULTILINE)
-    return re.sub(pattern, replacer, payload)
 
+def _analyze_file(path, language, analysis):
+    with open(path, 'rb') as stream:
+        _analyze_file_stream(path, stream, language, analysis)
 
-def _replace_word(match, analysis):
-    string = match.group()
-    reserved_words = analysis.reserved_words
-    if string in reserved_words:
-        return string
-    analysis.words[string] += 1
-    return "W"
 
+def _analyze_file_stream(path, stream, language, analysis, digest=None):
+    start = perf_counter()
+    try:
+        _analyze_chunks(_read_chunks(stream, digest), language, analysis)
+    except UnicodeError as error:
+        print(f"error while decoding file `{path}`")
+    if analysis.profile is not None:
+        analysis.profile.file(path, stream.tell(), perf_counter() - start)
 
-def _replace_name(match, analysis):
-    string = match.group()
-    analysis.names[string] += 1
-    return "N"
+
+def _read_chunks(stream, digest=None):
+    decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='ignore')
+    decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    while chunk := stream.read(CHUNK_SIZE):
+        if digest is not None:
+            digest.update(chunk)
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _analyze_chunks(chunks, language, analysis):
+    profile = analysis.profile
+    lexer = lexers.Lexer(language)
+    for chunk in profiling.timed_iterable(profile, "reading", chunks):
+        with profiling.phase(profile, "lexing"):
+            text = lexer.feed(chunk)
+        with profiling.phase(profile, "tokenizing"):
+            _analyze_text(text, analysis)
+    with profiling.phase(profile, "lexing"):
+        text = lexer.feed("", final=True)
+    with profiling.phase(profile, "tokenizing"):
+        _analyze_text(text, analysis)
+
+
+def _analyze_text(text, analysis):
+    parts = NAME_REGEX.split(text)
+    names = parts[1::2]
+    parts = _word_regex(analysis.reserved_words).split("N".join(parts[::2]))
+    words = parts[1::2]
+    lines = Counter(map(str.strip, "W".join(parts[::2]).split('\n')))
+    lines.pop("", None)
+
+    compressed_text = QUOTED_REGEX.sub("'W'", "\n".join(lines))
+    compressed_text = DIGIT_REGEX.sub("1", compressed_text)
+    compressed_text = REPEATED_CHARACTER_REGEX.sub(r'\1', compressed_text).replace("clas", "class")
+    for compressed_line, count in zip(compressed_text.split('\n'), lines.values()):
+        if _syntax_relevant(compressed_line):
+            analysis.patterns[compressed_line] += count
+    analysis.names.update(names)
+    analysis.words.update(words)
+
+
+@functools.cache
+def _word_regex(reserved_words):
+    reserved = "|".join(
+        f"(?<={re.escape(word[0])}){re.escape(word[1:])}(?!\\w)"
+        for word in sorted(reserved_words) if re.fullmatch(r'[a-z_]\w+', word)
+    )
+    not_reserved = f"(?!{reserved})" if reserved else ""
+    return re.compile(rf"([a-z_](?<![a-z_]{{2}}){not_reserved}\w+)")
 
 
 def _syntax_relevant(gram):
-    return not all(char in ["a", " ", "\t", "\n"] for char in gram) and len(gram) > 3
+    return len(gram) > 3 and gram.strip("a \t\n") != ""
+
 
+def _present(analysis, output, bundle_size=None):
+    counters = [analysis.patterns, analysis.words, analysis.names]
+    present_ranked(output, [
+        (counter.most_common(max(amount, bundle_size or 0)), counter.total(), _error_bound(counter))
+        for counter, (_, amount) in zip(counters, PRESENTED_LISTS)
+    ], bundle_size)
 
-def _present(analysis, output):
+
+def present_ranked(output, ranked_lists, bundle_size=None):
     os.makedirs(output, exist_ok=True)
-    _present_counter(analysis.patterns, f"{output}/patterns.txt", 25)
-    _present_counter(analysis.words, f"{output}/words.txt", 100)
-    _present_counter(analysis.names, f"{output}/names.txt", 100)
+    bundled = []
+    for (name, amount), (most_common, total, error_bound) in zip(PRESENTED_LISTS, ranked_lists):
+        _present_counts(most_common, total, error_bound, f"{output}/{name}.txt", amount)
+        bundled.append(most_common[:bundle_size or amount])
+    bundle.write_bundle(output, *bundled)
+
+
+def _error_bound(counter):
+    return counter.error_bound() if isinstance(counter, SpaceSaving) else 0
 
 
-def _present_counter(counter, filename, amount):
+def _present_counts(most_common, total, error_bound, filename, amount):
     rows = []
-    for count in counter.most_common(10):
-        rows.append(["".join(count[0]), _as_percent(count[1] / counter.total())])
+    for count in most_common[:10]:
+        rows.append(["".join(count[0]), _as_percent(count[1] / total)])
     print(tabulate(rows))
+    if error_bound:
+        print(f"Approximate counts, each one overestimated by at most {error_bound}")
     with open(filename, "w") as stream:
-        for count in counter.most_common(amount):
+        for count in most_common[:amount]:
             stream.write("".join(count[0]) + "\n")
+    with open(sampling.weights_filename(filename), "w") as stream:
+        for count in most_common[:amount]:
+            stream.write(f"{count[1]}\n")
 
 
 def _as_percent(value):
@@ -0,0 +1,180 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from collections.abc import Sequence
+from code_hanon.sampling import AliasTable
+
+BUNDLE_FILENAME = "exercises.bundle"
+BUNDLE_MAGIC = b"HANONBND"
+BUNDLE_VERSION = 1
+TEXT_FILENAMES = ["patterns.txt", "words.txt", "names.txt"]
+SLOT_REGEX = re.compile(r'([WN1])')
+HEADER = struct.Struct("<8sII")
+SECTION = struct.Struct("<32sQQ")
+ALIGNMENT = 8
+
+Bundle = namedtuple('Bundle', ['patterns', 'words', 'names', 'templates'])
+WeightedList = namedtuple('WeightedList', ['elements', 'table'])
+
+
+class StringTable(Sequence):
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+
+class TemplateTable(Sequence):
+    def __init__(self, offsets, parts):
+        self.offsets = offsets
+        self.parts = parts
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return [self.parts[part] for part in range(self.offsets[index], self.offsets[index + 1])]
+
+
+def write_bundle(output, patterns, words, names):
+    sections = {}
+    for name, elements in [("patterns", patterns), ("words", words), ("names", names)]:
+        _add_weighted_list(sections, name, elements)
+    templates = [SLOT_REGEX.split(pattern) for pattern, _ in patterns]
+    template_offsets = array('Q', [0])
+    for parts in templates:
+        template_offsets.append(template_offsets[-1] + len(parts))
+    sections["templates.index"] = template_offsets
+    _add_strings(sections, "templates", [part for parts in templates for part in parts])
+
+    position = HEADER.size + SECTION.size * len(sections)
+    directory = []
+    for name, data in sections.items():
+        position = _aligned(position)
+        data = data.tobytes() if isinstance(data, array) else data
+        directory.append((name, position, data))
+        position += len(data)
+
+    filename = os.path.join(output, BUNDLE_FILENAME)
+    with open(f"{filename}.tmp", "wb") as stream:
+        stream.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(directory)))
+        for name, offset, data in directory:
+            stream.write(SECTION.pack(name.encode(), offset, len(data)))
+        for name, offset, data in directory:
+            stream.write(b"\0" * (offset - stream.tell()))
+            stream.write(data)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def read_bundle(input_directory):
+    filename = os.path.join(input_directory, BUNDLE_FILENAME)
+    if sys.byteorder != "little" or not _up_to_date(filename, input_directory):
+        return None
+    with open(filename, "rb") as stream:
+        try:
+            buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    view = memoryview(buffer)
+    try:
+        magic, version, count = HEADER.unpack_from(view)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            print(f"ignoring `{filename}`, written by a different version of code-hanon")
+            return None
+        sections = {}
+        for index in range(count):
+            name, offset, length = SECTION.unpack_from(view, HEADER.size + index * SECTION.size)
+            if offset + length > len(view):
+                raise ValueError("truncated section")
+            sections[name.rstrip(b"\0").decode()] = view[offset:offset + length]
+        return Bundle(
+            _weighted_list(sections, "patterns"),
+            _weighted_list(sections, "words"),
+            _weighted_list(sections, "names"),
+            TemplateTable(sections["templates.index"].cast('Q'), _strings(sections, "templates"))
+        )
+    except (struct.error, KeyError, ValueError, TypeError):
+        print(f"ignoring `{filename}`, it is damaged")
+        return None
+
+
+def _add_weighted_list(sections, name, elements):
+    _add_strings(sections, name, [element for element, _ in elements])
+    weights = [count for _, count in elements]
+    table = AliasTable(weights)
+    sections[f"{name}.weights"] = array('Q', weights)
+    sections[f"{name}.probabilities"] = array('d', table.probabilities)
+    sections[f"{name}.aliases"] = array('Q', table.aliases)
+
+
+def _add_strings(sections, name, strings):
+    offsets = array('Q', [0])
+    data = bytearray()
+    for string in strings:
+        data += string.encode()
+        offsets.append(len(data))
+    sections[f"{name}.offsets"] = offsets
+    sections[f"{name}.data"] = bytes(data)
+
+
+def _weighted_list(sections, name):
+    elements = _strings(sections, name)
+    probabilities = sections[f"{name}.probabilities"].cast('d')
+    aliases = sections[f"{name}.aliases"].cast('Q')
+    if not len(probabilities) == len(aliases) == len(elements):
+        raise ValueError(f"inconsistent {name}")
+    return WeightedList(elements, AliasTable.from_arrays(probabilities, aliases))
+
+
+def _strings(sections, name):
+    offsets = sections[f"{name}.offsets"].cast('Q')
+    data = sections[f"{name}.data"]
+    if len(offsets) == 0 or offsets[-1] > len(data):
+        raise ValueError(f"inconsistent {name}")
+    return StringTable(offsets, data)
+
+
+def _up_to_date(filename, input_directory):
+    try:
+        modified = os.stat(filename).st_mtime_ns
+    except OSError:
+        return False
+    for text_filename in TEXT_FILENAMES:
+        try:
+            if os.stat(os.path.join(input_directory, text_filename)).st_mtime_ns > modified:
+                return False
+        except OSError:
+            pass
+    return True
+
+
+def _aligned(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
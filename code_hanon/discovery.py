@@ -0,0 +1,116 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import fnmatch
+import os
+import re
+from collections import namedtuple
+
+SKIPPED_DIRECTORIES = [".git", "node_modules", "build"]
+GITIGNORE_FILENAME = ".gitignore"
+
+IgnoreRule = namedtuple('IgnoreRule', ['prefix_length', 'regex', 'negated', 'directory_only'])
+
+
+def discover(directory, extensions, skipped=SKIPPED_DIRECTORIES, gitignore=False):
+    matcher = re.compile("|".join(fnmatch.translate(extension) for extension in extensions))
+    skipped = set(skipped)
+    pending = [(directory, [])]
+    while pending:
+        current, rules = pending.pop()
+        if gitignore:
+            rules = rules + _read_gitignore(current)
+        try:
+            with os.scandir(current) as iterator:
+                entries = sorted(iterator, key=lambda e: e.name)
+        except OSError as error:
+            print(f"error while reading directory `{current}`: {error.strerror}")
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in skipped and not _ignored(rules, entry.path, True):
+                    subdirectories.append((entry.path, rules))
+            elif entry.is_file() and matcher.match(entry.name) and not _ignored(rules, entry.path, False):
+                yield entry.path
+        pending.extend(reversed(subdirectories))
+
+
+def _read_gitignore(directory):
+    try:
+        with open(os.path.join(directory, GITIGNORE_FILENAME), 'r', errors='ignore') as stream:
+            lines = stream.read().splitlines()
+    except OSError:
+        return []
+    return [rule for rule in (_parse_gitignore_line(directory, line) for line in lines) if rule]
+
+
+def _parse_gitignore_line(base, line):
+    line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    if line.startswith("\\"):
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    regex = _glob_to_regex(line)
+    if not anchored:
+        regex = f"(?:.*/)?{regex}"
+    return IgnoreRule(len(os.path.join(base, "")), re.compile(f"{regex}$"), negated, directory_only)
+
+
+def _glob_to_regex(glob):
+    regex = ""
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif glob.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif glob[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif glob[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif glob[i] == "[" and "]" in glob[i + 1:]:
+            end = glob.index("]", i + 1)
+            characters = glob[i + 1:end].replace("\\", "\\\\")
+            regex += "[" + ("^" + characters[1:] if characters.startswith("!") else characters) + "]"
+            i = end + 1
+        else:
+            regex += re.escape(glob[i])
+            i += 1
+    return regex
+
+
+def _ignored(rules, path, is_directory):
+    ignored = False
+    for rule in rules:
+        if rule.directory_only and not is_directory:
+            continue
+        if rule.regex.match(path[rule.prefix_length:].replace(os.sep, "/")):
+            ignored = not rule.negated
+    return ignored
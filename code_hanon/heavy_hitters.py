@@ -0,0 +1,71 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+from collections import Counter
+from operator import itemgetter
+
+
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.heap = []
+        self.stream_total = 0
+        self.evictions = 0
+
+    def update(self, elements):
+        if not hasattr(elements, 'items'):
+            elements = Counter(elements)
+        for element, weight in elements.items():
+            self.add(element, weight)
+
+    def add(self, element, weight=1):
+        self.stream_total += weight
+        counts = self.counts
+        if element in counts:
+            counts[element] += weight
+            return
+        if len(counts) < self.capacity:
+            counts[element] = weight
+            heapq.heappush(self.heap, (weight, element))
+            return
+
+        heap = self.heap
+        while True:
+            count, victim = heap[0]
+            if counts[victim] == count:
+                break
+            heapq.heapreplace(heap, (counts[victim], victim))
+        heapq.heapreplace(heap, (count + weight, element))
+        del counts[victim]
+        counts[element] = count + weight
+        self.evictions += 1
+
+    def items(self):
+        return self.counts.items()
+
+    def most_common(self, n=None):
+        if n is None:
+            return sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def total(self):
+        return self.stream_total
+
+    def error_bound(self):
+        if not self.evictions:
+            return 0
+        return min(self.counts.values())
@@ -17,16 +17,33 @@ supported = {
     "ruby": {
         "extensions": ["*.rb"],
         "reserved_words": ["class", "module", "do", "map", "expect", "to", "eq", "def", "end", "if", "it", "require",
-                           "nil", "context", "describe"]
+                           "nil", "context", "describe"],
+        "lexer": {
+            "block_comments": [(r"(?<![^\n])=begin\b", r"^=end\b[^\n]*")],
+            "line_comments": ["#"],
+            "strings": ['"', "'"],
+            "multiline_strings": ['"', "'"]
+        }
     },
     "python": {
         "extensions": ["*.py"],
         "reserved_words": ["class", "return", "import", "from", "def", "if", "for", "while", "with", "in", "and", "not",
-                           "or", "self"]
+                           "or", "self"],
+        "lexer": {
+            "line_comments": ["#"],
+            "strings": ['"""', "'''", '"', "'"],
+            "multiline_strings": ['"""', "'''"],
+            "docstrings": ['"""', "'''"]
+        }
     },
     "c": {
         "extensions": ["*.c", "*.h"],
         "reserved_words": ["for", "while", "do", "const", "statis", "void", "#include", "#ifndef", "#define", "#endif"],
-        "comments": r'//.*?$|/\*.*?\*/|\'(?:\\.|[^\\\'])*\'|"(?:\\.|[^\\"])*"'
+        "lexer": {
+            "block_comments": [(r"/\*", r"\*/")],
+            "line_comments": ["//"],
+            "strings": ['"', "'"],
+            "multiline_strings": ['"', "'"]
+        }
     }
 }
@@ -0,0 +1,52 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def grouped_percentiles(codes, values, groups, percentiles=PERCENTILES):
+    codes, values = np.asarray(codes), np.asarray(values)
+    sorted_values = values[np.lexsort((values, codes))].astype(np.float64)
+    counts = np.bincount(codes, minlength=groups)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    result = np.full((groups, len(percentiles)), np.nan)
+    sampled = counts > 0
+    starts, ends, counts = starts[sampled], ends[sampled], counts[sampled]
+    for column, percentile in enumerate(percentiles):
+        position = starts + (counts - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, ends - 1)
+        fraction = position - lower
+        result[sampled, column] = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+    return result
+
+
+def variances(counts, totals, squares):
+    counts = np.asarray(counts, dtype=np.float64)
+    totals, squares = np.asarray(totals, dtype=np.float64), np.asarray(squares, dtype=np.float64)
+    means = np.divide(totals, counts, out=np.zeros_like(counts), where=counts > 0)
+    result = np.divide(squares, counts, out=np.zeros_like(counts), where=counts > 0) - means ** 2
+    return np.maximum(result, 0)
+
+
+def grouped_variances(codes, values, groups):
+    codes, values = np.asarray(codes), np.asarray(values)
+    counts = np.bincount(codes, minlength=groups)
+    totals = np.bincount(codes, weights=values, minlength=groups)
+    squares = np.bincount(codes, weights=values.astype(np.float64) ** 2, minlength=groups)
+    return variances(counts, totals, squares)
@@ -0,0 +1,107 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import functools
+import re
+from collections import namedtuple
+from code_hanon import languages
+
+COMMENT, STRING = range(2)
+
+Token = namedtuple('Token', ['kind', 'closing', 'unterminated', 'docstring'])
+
+
+class Lexer:
+    def __init__(self, language):
+        self.regex, self.tokens = compile_lexer(language)
+        self.token = None
+        self.carry = ""
+        self.incomplete_line = ""
+
+    def feed(self, text, final=False):
+        text = self._lex(text, final)
+        if final:
+            text, self.incomplete_line = self.incomplete_line + text, ""
+            return text
+        text = self.incomplete_line + text
+        end = text.rfind("\n") + 1
+        self.incomplete_line = text[end:]
+        return text[:end]
+
+    def _lex(self, text, final):
+        text = self.carry + text
+        if final:
+            self.carry = ""
+        else:
+            end = text.rfind("\n") + 1
+            self.carry = text[end:]
+            text = text[:end]
+
+        prefix = ""
+        if self.token is not None:
+            match = self.token.closing.match(text)
+            end = match.end() if match else len(text)
+            if self.token.kind == STRING:
+                prefix = text[:end]
+            text = text[end:]
+            if not match:
+                return prefix
+            self.token = None
+        return prefix + self.regex.sub(self._replace, text)
+
+    def _replace(self, match):
+        token = self.tokens[match.lastindex]
+        if token.docstring and _starts_line(match.string, match.start()):
+            token = token._replace(kind=COMMENT)
+        if match.lastindex == token.unterminated:
+            self.token = token
+        return match.group() if token.kind == STRING else " "
+
+
+@functools.cache
+def compile_lexer(language):
+    specification = languages.supported[language].get("lexer", {})
+    openings = []
+    for start, end in specification.get("block_comments", []):
+        openings.append((COMMENT, start, f".*?{end}", False))
+    for start in specification.get("line_comments", []):
+        openings.append((COMMENT, re.escape(start), r"[^\n]*", False))
+    multiline = specification.get("multiline_strings", [])
+    docstrings = specification.get("docstrings", [])
+    for quote in specification.get("strings", []):
+        openings.append((STRING, re.escape(quote), _string_content(quote, quote in multiline), quote in docstrings))
+
+    alternatives = []
+    tokens = {}
+    for kind, opening, closing, docstring in openings:
+        group = 2 * len(alternatives) + 1
+        closing_regex = re.compile(closing, re.DOTALL | re.MULTILINE)
+        tokens[group] = tokens[group + 1] = Token(kind, closing_regex, group + 1, docstring)
+        alternatives.append(f"{opening}(?:{closing}()|(.*)\\Z)")
+    regex = "|".join(alternatives) or r"(?!)"
+    return re.compile(regex, re.DOTALL | re.MULTILINE), tokens
+
+
+def _string_content(quote, multiline):
+    first = re.escape(quote[0])
+    excluded = f"[^\\\\{first}]" if multiline else f"[^\\\\{first}\\n]"
+    escaped = r"\\." if len(quote) == 1 else rf"\\.|{first}(?!{re.escape(quote[1:])})"
+    ending = re.escape(quote) if multiline else rf"(?:{re.escape(quote)}|(?=\n)|\Z)"
+    return f"{excluded}*(?:(?:{escaped}){excluded}*)*{ending}"
+
+
+def _starts_line(text, position):
+    line_start = text.rfind("\n", 0, position) + 1
+    return line_start == position or text[line_start:position].isspace()
@@ -13,68 +13,174 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import codecs
+import locale
+import os
+import select
+import signal
 import sys
 import termios
 import tty
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import monotonic_ns
 from termcolor import colored
+from code_hanon import profiling
 from code_hanon import statistics_repository
 from code_hanon.practice_session import PracticeSession
+from code_hanon.trace import TraceWriter
 
+RESTORED_SIGNALS = [signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT]
 
-def getch():
-    fd = sys.stdin.fileno()
+
+@contextmanager
+def raw_terminal(stream=sys.stdin):
+    fd = stream.fileno()
     old_settings = termios.tcgetattr(fd)
+    old_handlers = {signum: signal.signal(signum, _exit_on_signal) for signum in RESTORED_SIGNALS}
     try:
-        tty.setraw(sys.stdin.fileno())
-        ch = sys.stdin.read(1)
+        tty.setraw(fd)
+        yield
     finally:
         termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-    return ch
+        for signum, handler in old_handlers.items():
+            signal.signal(signum, handler)
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(128 + signum)
+
 
+class KeyReader:
+    def __init__(self, fd):
+        self.fd = fd
+        self.decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='replace')
+        self.pending = deque()
 
-def start(input_directory, config):
-    statistics_repository.prepare()
-    session = PracticeSession(input_directory, config)
+    def read(self):
+        while not self.pending:
+            select.select([self.fd], [], [])
+            timestamp = monotonic_ns()
+            data = os.read(self.fd, 1024)
+            if not data:
+                return "\x03", timestamp
+            self.pending.extend((char, timestamp) for char in self.decoder.decode(data))
+        return self.pending.popleft()
 
-    for challenge, next_challenge in session.challenges():
+
+class TerminalRenderer:
+    def __init__(self, stream):
+        self.stream = stream
+        self.grey = colored("%s", "light_grey")
+        self.green = colored("%s", "green")
+        self.red = colored("%s", "red")
+        self.erased = "\b" + self.grey + "\b"
+        self.success = colored(" ✓", "green") + "\r\n"
+        self.failure = colored(" x", "red") + "\r\n"
+
+    def challenge(self, challenge, next_challenge):
         if next_challenge:
-            text = colored(f"{challenge.display_string}\n{next_challenge.display_string}", "light_grey")
-            sys.stdout.write(text + "\r\033[1A")
+            self.stream.write(self.grey % f"{challenge.display_string}\r\n{next_challenge.display_string}" + "\r\033[1A")
         else:
-            text = colored(f"{challenge.display_string}", "light_grey")
-            sys.stdout.write(text + "\r")
+            self.stream.write(self.grey % challenge.display_string + "\r")
+        self.stream.flush()
+
+    def erase(self, char):
+        self.stream.write(self.erased % char)
+
+    def valid(self, char):
+        self.stream.write(self.green % char)
+
+    def invalid(self, char):
+        self.stream.write(self.red % char)
+
+    def result(self, ok):
+        self.stream.write(self.success if ok else self.failure)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class NullRenderer:
+    def challenge(self, challenge, next_challenge):
+        pass
 
-        sys.stdout.flush()
+    def erase(self, char):
+        pass
+
+    def valid(self, char):
+        pass
+
+    def invalid(self, char):
+        pass
+
+    def result(self, ok):
+        pass
+
+    def flush(self):
+        pass
+
+
+def start(input_directory, config, profile=None, record=None):
+    with profiling.phase(profile, "setup"):
+        statistics_repository.prepare()
+        session = PracticeSession(input_directory, config)
+
+    with open(record, "a") if record else nullcontext() as trace_stream:
+        trace = None
+        if trace_stream:
+            trace = TraceWriter(trace_stream)
+            trace.session(session.writer.timestamp, session.orders)
+        session.start()
+        try:
+            with raw_terminal():
+                completed = run(session, KeyReader(sys.stdin.fileno()), TerminalRenderer(sys.stdout), profile, trace)
+        finally:
+            with profiling.phase(profile, "statistics"):
+                session.close()
+    session.finish()
+    if not completed:
+        sys.exit(1)
+
+
+def run(session, keys, renderer, profile=None, trace=None):
+    for challenge, next_challenge in profiling.timed_iterable(profile, "challenge generation", session.challenges()):
+        if trace:
+            trace.challenge(challenge)
+        renderer.challenge(challenge, next_challenge)
         pos = 0
 
         while True:
-            char = getch()
+            char, timestamp = keys.read()
+            if trace:
+                trace.key(char, timestamp)
             if is_ctrl_c(char):
-                session.finish()
-                sys.exit(1)
-            if is_backspace(char):
-                if pos > 0:
-                    pos -= 1
-                    sys.stdout.write(f"\b{colored(challenge.string[pos], 'light_grey')}\b")
-            elif char == challenge.string[pos]:
-                sys.stdout.write(colored(challenge.display_string[pos], "green"))
-                session.valid_input(pos)
-                pos += 1
-            else:
-                if pos > 0:
-                    sys.stdout.write(colored(challenge.display_string[pos], "red"))
-                    session.invalid_input(pos)
+                return False
+            with profiling.phase(profile, "keystroke"):
+                received = monotonic_ns()
+                if is_backspace(char):
+                    if pos > 0:
+                        pos -= 1
+                        renderer.erase(challenge.string[pos])
+                elif char == challenge.string[pos]:
+                    renderer.valid(challenge.display_string[pos])
+                    session.valid_input(pos, timestamp)
                     pos += 1
-            sys.stdout.flush()
-
-            if pos == len(challenge.string):
-                if session.challenge_ok():
-                    print(colored(" ✓", "green"))
                 else:
-                    print(colored(" x", "red"))
-                session.challenge_end()
-                break
-    session.finish()
+                    if pos > 0:
+                        renderer.invalid(challenge.display_string[pos])
+                        session.invalid_input(pos, timestamp)
+                        pos += 1
+
+                if pos == len(challenge.string):
+                    renderer.result(session.challenge_ok())
+                    renderer.flush()
+                    session.rendered(monotonic_ns() - received)
+                    session.challenge_end()
+                    break
+                renderer.flush()
+                session.rendered(monotonic_ns() - received)
+    return True
 
 
 def is_backspace(char):
@@ -1,26 +1,93 @@
 import random
-import re
 import sys
 from collections import namedtuple
-from code_hanon.session_statistics import SessionStatistics
+from code_hanon.bundle import SLOT_REGEX, read_bundle
+from code_hanon.session_statistics import NGRAM_ORDERS, SessionStatistics
+from code_hanon.sampling import AliasTable, read_weights
+from code_hanon.scheduler import DrillScheduler
 from code_hanon import statistics_repository
 
 
 Challenge = namedtuple('Challenge', ['pattern', 'string', 'display_string'])
 
 
-class PracticeSession:
-    def __init__(self, input_directory, config):
-        self.valid_strokes = 0
-        self.invalid_strokes = 0
-        self.generator_patterns = self.read_generator_file(f"{input_directory}/patterns.txt")
-        self.generator_words = self.read_generator_file(f"{input_directory}/words.txt")
-        self.generator_names = self.read_generator_file(f"{input_directory}/names.txt")
-        self.statistics = SessionStatistics()
+class TypingSession:
+    def __init__(self, config, timestamp=None):
+        self.orders = ngram_orders(config)
+        self.statistics = SessionStatistics(self.orders)
+        self.writer = statistics_repository.StatisticsWriter(timestamp)
         self.current_challenge = ""
         self.config = config
         self.repeat_failures = []
 
+    def _yield_challenge(self, challenge, next_challenge):
+        self.statistics.start(challenge.pattern, challenge.display_string)
+        self.current_challenge = challenge
+        yield challenge, next_challenge
+
+    def challenge_ok(self):
+        return self.statistics.challenge_ok
+
+    def challenge_end(self):
+        if not self.challenge_ok():
+            for i in range(self.config.get('repeat_failures', 0)):
+                self.repeat_failures.append(self.current_challenge)
+        self.statistics.challenge_end()
+        self.writer.write(self.statistics.challenge_statistics())
+
+    def valid_input(self, pos, timestamp=None):
+        self.statistics.valid_input(pos, timestamp)
+
+    def invalid_input(self, pos, timestamp=None):
+        self.statistics.invalid_input(pos, timestamp)
+
+    def rendered(self, elapsed):
+        self.statistics.rendered(elapsed)
+
+    def start(self):
+        self.writer.start()
+
+    def close(self):
+        self.writer.finish()
+
+    def finish(self):
+        self.close()
+        self.statistics.print()
+        if self.config.get('compact_statistics', False):
+            statistics_repository.compact(vacuum=False)
+
+
+class PracticeSession(TypingSession):
+    def __init__(self, input_directory, config):
+        super().__init__(config)
+        self.valid_strokes = 0
+        self.invalid_strokes = 0
+        bundle = read_bundle(input_directory)
+        if bundle:
+            self.generator_patterns, self.pattern_table = bundle.patterns
+            self.generator_words, self.word_table = bundle.words
+            self.generator_names, self.name_table = bundle.names
+            self.templates = bundle.templates
+        else:
+            self.generator_patterns = self.read_generator_file(f"{input_directory}/patterns.txt")
+            self.generator_words = self.read_generator_file(f"{input_directory}/words.txt")
+            self.generator_names = self.read_generator_file(f"{input_directory}/names.txt")
+            self.templates = [SLOT_REGEX.split(pattern) for pattern in self.generator_patterns]
+            self.pattern_table = self.read_alias_table(f"{input_directory}/patterns.txt", self.generator_patterns)
+            self.word_table = self.read_alias_table(f"{input_directory}/words.txt", self.generator_words)
+            self.name_table = self.read_alias_table(f"{input_directory}/names.txt", self.generator_names)
+        self.slot_fillers = {
+            'W': lambda: self.generator_words[self.word_table.sample()],
+            'N': lambda: self.generator_names[self.name_table.sample()],
+            '1': lambda: str(random.randint(0, 99)),
+        }
+        self.scheduler = None
+        if config.get('adaptive', 0) > 0:
+            self.scheduler = DrillScheduler(
+                self.templates, {'W': self.generator_words, 'N': self.generator_names}, self.orders
+            )
+            self.scheduler.target(statistics_repository.weakest_ngrams(self.scheduler.reachable_ngrams()))
+
     def read_generator_file(self, filename):
         try:
             with open(filename, "r") as stream:
@@ -30,6 +97,9 @@ class PracticeSession:
             print(f"Error: The file '{filename}' was not found in the input directory")
             sys.exit(1)
 
+    def read_alias_table(self, filename, elements):
+        return AliasTable(read_weights(filename, len(elements)))
+
     def challenges(self):
         challenges = list(map(
             lambda _: self.generate_challenge(),
@@ -40,16 +110,21 @@ class PracticeSession:
         for challenge, next_challenge in zip(self.repeat_failures, self.repeat_failures[1:] + [None]):
             yield from self._yield_challenge(challenge, next_challenge)
 
-    def _yield_challenge(self, challenge, next_challenge):
-        self.statistics.start(challenge.pattern, challenge.display_string)
-        self.current_challenge = challenge
-        yield challenge, next_challenge
-
     def generate_challenge(self):
-        generator_pattern = random.sample(self.generator_patterns, 1)[0]
-        challenge_string = re.sub(r'W', lambda x: random.sample(self.generator_words, 1)[0], generator_pattern)
-        challenge_string = re.sub(r'N', lambda x: random.sample(self.generator_names, 1)[0], challenge_string)
-        challenge_string = re.sub(r'1', lambda x: str(random.randint(0, 99)), challenge_string)
+        drill = None
+        if self.scheduler and random.random() < self.config['adaptive']:
+            drill = self.scheduler.pick()
+        index = drill.pattern if drill else self.pattern_table.sample()
+        generator_pattern = self.generator_patterns[index]
+        parts = self.templates[index][:]
+        drilled_slot = drill.slot if drill else None
+        for slot in range(1, len(parts), 2):
+            if parts[slot] == drilled_slot:
+                parts[slot] = drill.element
+                drilled_slot = None
+            else:
+                parts[slot] = self.slot_fillers[parts[slot]]()
+        challenge_string = "".join(parts)
         if self.config['press_enter']:
             display_string = challenge_string + "↩"
             challenge_string += "\x0d"
@@ -57,22 +132,11 @@ class PracticeSession:
             display_string = challenge_string
         return Challenge(generator_pattern, challenge_string, display_string)
 
-    def challenge_ok(self):
-        return self.statistics.challenge_ok
-
-    def challenge_end(self):
-        if not self.challenge_ok():
-            for i in range(self.config['repeat_failures']):
-                self.repeat_failures.append(self.current_challenge)
-        self.statistics.challenge_end()
-
-    def valid_input(self, pos):
-        self.statistics.valid_input(pos)
-
-    def invalid_input(self, pos):
-        self.statistics.invalid_input(pos)
-
-    def finish(self):
-        self.statistics.print()
-        statistics_repository.update_statistics(self.statistics)
 
+def ngram_orders(config):
+    orders = config.get('ngram_orders', NGRAM_ORDERS)
+    orders = [orders] if isinstance(orders, int) else orders
+    if not orders or not all(isinstance(order, int) and order > 0 for order in orders):
+        print(f"Error: `ngram_orders` must be a list of positive integers, not {orders}")
+        sys.exit(1)
+    return tuple(sorted(set(orders)))
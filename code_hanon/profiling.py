@@ -0,0 +1,127 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import cProfile
+import heapq
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, process_time
+from tabulate import tabulate
+
+SLOWEST_FILES = 10
+
+
+class Profile:
+    def __init__(self):
+        self.wall = Counter()
+        self.cpu = Counter()
+        self.calls = Counter()
+        self.slowest_files = []
+        self.files = 0
+        self.bytes = 0
+
+    @contextmanager
+    def phase(self, name):
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - wall, process_time() - cpu)
+
+    def add(self, name, wall, cpu, calls=1):
+        self.wall[name] += wall
+        self.cpu[name] += cpu
+        self.calls[name] += calls
+
+    def file(self, path, size, elapsed):
+        self.files += 1
+        self.bytes += size
+        if len(self.slowest_files) < SLOWEST_FILES:
+            heapq.heappush(self.slowest_files, (elapsed, path, size))
+        else:
+            heapq.heappushpop(self.slowest_files, (elapsed, path, size))
+
+    def merge(self, other):
+        self.wall.update(other.wall)
+        self.cpu.update(other.cpu)
+        self.calls.update(other.calls)
+        self.files += other.files
+        self.bytes += other.bytes
+        for slow_file in other.slowest_files:
+            self.file(*slow_file[1:], slow_file[0])
+            self.files -= 1
+            self.bytes -= slow_file[2]
+
+    def print(self, elapsed):
+        print("Profile")
+        rows = []
+        for name, wall in self.wall.items():
+            rows.append([
+                f" {name}", "%.3f" % wall, "%.3f" % self.cpu[name], self.calls[name],
+                "%.1f %%" % (wall * 100 / elapsed if elapsed else 0), "%.3f" % (wall * 1000 / self.calls[name]) if self.calls[name] else "-"
+            ])
+        rows.append([" total", "%.3f" % elapsed, "", "", "", ""])
+        print(tabulate(rows, headers=["Phase", "Wall (s)", "CPU (s)", "Calls", "Share", "Per call (ms)"]))
+        if self.files:
+            print(
+                f"{self.files} files, %.1f files/s, %.2f MB/s"
+                % (self.files / elapsed, self.bytes / elapsed / (1 << 20))
+            )
+            rows = [
+                [path, size, "%.3f" % (seconds * 1000)]
+                for seconds, path, size in sorted(self.slowest_files, reverse=True)
+            ]
+            print(tabulate(rows, headers=["Slowest files", "Bytes", "Time (ms)"]))
+
+
+def phase(profile, name):
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def timed_iterable(profile, name, iterable):
+    if profile is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        wall, cpu = perf_counter(), process_time()
+        try:
+            element = next(iterator)
+        except StopIteration:
+            profile.add(name, perf_counter() - wall, process_time() - cpu, 0)
+            return
+        profile.add(name, perf_counter() - wall, process_time() - cpu)
+        yield element
+
+
+@contextmanager
+def profiling(enabled, output=None):
+    if not enabled:
+        yield None
+        return
+    profile = Profile()
+    profiler = cProfile.Profile() if output else None
+    start = perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield profile
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(output)
+        profile.print(perf_counter() - start)
+        if profiler:
+            print(f"cProfile statistics written to {output}")
@@ -0,0 +1,74 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+from time import perf_counter
+from code_hanon import practice
+from code_hanon import profiling
+from code_hanon import statistics_repository
+from code_hanon import trace
+from code_hanon.practice_session import TypingSession
+
+
+class ReplaySession(TypingSession):
+    def __init__(self, recorded_session):
+        super().__init__({'ngram_orders': recorded_session.orders}, recorded_session.timestamp)
+        self.recorded_challenges = recorded_session.challenges
+
+    def challenges(self):
+        challenges = self.recorded_challenges
+        for challenge, next_challenge in zip(challenges, challenges[1:] + [None]):
+            yield from self._yield_challenge(challenge, next_challenge)
+
+
+def replay(filenames, profile=None):
+    statistics_repository.prepare()
+    sessions = 0
+    skipped = 0
+    keystrokes = 0
+    start = perf_counter()
+    for filename in filenames:
+        try:
+            with open(filename) as stream:
+                for recorded_session in trace.read_sessions(stream):
+                    if statistics_repository.session_stored(recorded_session.timestamp):
+                        skipped += 1
+                        continue
+                    replay_session(recorded_session, profile)
+                    sessions += 1
+                    keystrokes += len(recorded_session.keys)
+        except OSError as error:
+            print(f"error while reading trace `{filename}`: {error.strerror}")
+            sys.exit(1)
+        except ValueError as error:
+            print(f"error while reading trace `{filename}`: {error}")
+            sys.exit(1)
+    elapsed = perf_counter() - start
+    print(
+        f"Replayed {sessions} sessions and {keystrokes} keystrokes in %.2f s (%.1f µs per keystroke)"
+        % (elapsed, elapsed * 1000000 / keystrokes if keystrokes else 0)
+    )
+    if skipped:
+        print(f"Skipped {skipped} sessions already in the statistics")
+
+
+def replay_session(recorded_session, profile=None):
+    session = ReplaySession(recorded_session)
+    session.start()
+    try:
+        practice.run(session, trace.RecordedKeys(recorded_session.keys), practice.NullRenderer(), profile)
+    finally:
+        with profiling.phase(profile, "statistics"):
+            session.close()
@@ -0,0 +1,66 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import random
+
+
+def weights_filename(filename):
+    root, extension = os.path.splitext(filename)
+    return f"{root}_weights{extension}"
+
+
+def read_weights(filename, amount):
+    try:
+        with open(weights_filename(filename), "r") as stream:
+            weights = [int(line) for line in stream.read().split()]
+    except (OSError, ValueError):
+        return [1] * amount
+    if len(weights) != amount or sum(weights) <= 0:
+        return [1] * amount
+    return weights
+
+
+class AliasTable:
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.probabilities = [1.0] * self.size
+        self.aliases = list(range(self.size))
+        total = sum(weights)
+        if not total:
+            return
+
+        scaled = [weight * self.size / total for weight in weights]
+        small = [i for i, probability in enumerate(scaled) if probability < 1.0]
+        large = [i for i, probability in enumerate(scaled) if probability >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    @classmethod
+    def from_arrays(cls, probabilities, aliases):
+        table = cls([])
+        table.size = len(probabilities)
+        table.probabilities = probabilities
+        table.aliases = aliases
+        return table
+
+    def sample(self, generator=random):
+        position = generator.random() * self.size
+        column = int(position)
+        return column if position - column < self.probabilities[column] else self.aliases[column]
@@ -0,0 +1,88 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import random
+from collections import namedtuple
+from code_hanon.sampling import AliasTable
+
+NGRAM_LENGTH = 3
+SCHEDULED_ENTRIES = 2000
+
+Drill = namedtuple('Drill', ['ngram', 'pattern', 'slot', 'element'])
+
+
+class DrillScheduler:
+    def __init__(self, templates, slot_elements, orders=(NGRAM_LENGTH,), entries=SCHEDULED_ENTRIES):
+        templates = _head(templates, entries)
+        slot_elements = {slot: _head(elements, entries) for slot, elements in slot_elements.items()}
+        self.pattern_index = _index(
+            ((position, literal) for position, parts in enumerate(templates) for literal in parts[::2]), orders
+        )
+        self.slot_elements = slot_elements
+        self.slot_patterns = {
+            slot: [position for position, parts in enumerate(templates) if slot in parts[1::2]]
+            for slot in slot_elements
+        }
+        self.slot_indexes = {
+            slot: _index(enumerate(elements), orders) if self.slot_patterns[slot] else {}
+            for slot, elements in slot_elements.items()
+        }
+        self.targets = []
+        self.target_table = AliasTable([])
+
+    def reachable_ngrams(self):
+        ngrams = set(self.pattern_index)
+        for index in self.slot_indexes.values():
+            ngrams.update(index)
+        return ngrams
+
+    def target(self, weaknesses):
+        reachable = self.reachable_ngrams()
+        self.targets = []
+        weights = []
+        for ngram, weakness in weaknesses:
+            if weakness > 0 and ngram in reachable:
+                self.targets.append(ngram)
+                weights.append(weakness)
+        self.target_table = AliasTable(weights)
+
+    def pick(self, generator=random):
+        if not self.targets:
+            return None
+        ngram = self.targets[self.target_table.sample(generator)]
+        if ngram in self.pattern_index:
+            return Drill(ngram, generator.choice(self.pattern_index[ngram]), None, None)
+        slot = generator.choice([slot for slot, index in self.slot_indexes.items() if ngram in index])
+        return Drill(
+            ngram,
+            generator.choice(self.slot_patterns[slot]),
+            slot,
+            self.slot_elements[slot][generator.choice(self.slot_indexes[slot][ngram])]
+        )
+
+
+def _head(elements, entries):
+    return [elements[position] for position in range(min(entries, len(elements)))]
+
+
+def _index(elements, orders=(NGRAM_LENGTH,)):
+    index = {}
+    for position, text in elements:
+        for order in orders:
+            for start in range(len(text) - order + 1):
+                positions = index.setdefault(text[start:start + order], [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+    return index
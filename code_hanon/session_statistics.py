@@ -1,22 +1,49 @@
-from collections import Counter
-from time import perf_counter
+from array import array
+from collections import Counter, namedtuple
+from time import monotonic_ns
 
 from tabulate import tabulate
 
+UNSET = 0
+VALID_CHAR = 1
+FAILED_CHAR = 2
+NGRAM_ORDERS = (3,)
+UNBROKEN = 1 << 30
+CHAR_BITS = 21
+
+ChallengeStatistics = namedtuple('ChallengeStatistics', ['keys', 'failed_keys', 'valid_keys', 'valid_latencies'])
+
 
 class SessionStatistics:
-    def __init__(self):
+    __slots__ = (
+        'valid_strokes', 'invalid_strokes', 'total_time_per_char', 'total_render_time', 'renders', 'before',
+        'orders', 'masks', 'keys', 'key_ids', 'ok_chars', 'ok_runs', 'challenge_keys',
+        'failed_keys', 'valid_keys',
+        'valid_latencies', 'failed_patterns', 'valid_patterns', 'challenge_failed_start', 'challenge_valid_start',
+        'challenge_string', 'generator_pattern', 'challenge_ok',
+    )
+
+    def __init__(self, orders=NGRAM_ORDERS):
         self.valid_strokes = 0
         self.invalid_strokes = 0
         self.total_time_per_char = 0.0
-        self.before = perf_counter()
-        self.ok_chars = []
-        self.latency_per_char = []
-        self.failed_3grams = Counter()
+        self.total_render_time = 0
+        self.renders = 0
+        self.before = monotonic_ns()
+        self.orders = tuple(sorted(set(orders)))
+        self.masks = [(1 << (CHAR_BITS * order)) - 1 for order in self.orders]
+        self.keys = []
+        self.key_ids = {}
+        self.ok_chars = array('b')
+        self.ok_runs = array('l')
+        self.challenge_keys = array('l')
+        self.failed_keys = array('l')
+        self.valid_keys = array('l')
+        self.valid_latencies = array('l')
         self.failed_patterns = Counter()
-        self.valid_3grams = Counter()
         self.valid_patterns = Counter()
-        self.latency_3grams = []
+        self.challenge_failed_start = 0
+        self.challenge_valid_start = 0
         self.challenge_string = None
         self.generator_pattern = None
         self.challenge_ok = True
@@ -24,57 +51,106 @@ class SessionStatistics:
     def start(self, generator_pattern, challenge_string):
         self.challenge_string = challenge_string
         self.generator_pattern = generator_pattern
-        self.ok_chars = [None] * len(challenge_string)
-        self.latency_per_char = [0] * len(challenge_string)
+        length = len(challenge_string)
+        orders = self.orders
+        if len(self.ok_chars) < length:
+            self.ok_chars = array('b', [UNSET]) * length
+            self.ok_runs = array('l', [0]) * length
+            self.challenge_keys = array('l', [0]) * (length * len(orders))
+        else:
+            for pos in range(length):
+                self.ok_chars[pos] = UNSET
+
+        masks = self.masks
+        window_mask = masks[-1]
+        window = 0
+        for _ in range(orders[-1] - 1):
+            window = (window << CHAR_BITS | (ord("$") + 1)) & window_mask
+        position = 0
+        for pos in range(length):
+            window = (window << CHAR_BITS | (ord(self.at(pos)) + 1)) & window_mask
+            for mask in masks:
+                self.challenge_keys[position] = self.key_id(window & mask, generator_pattern)
+                position += 1
         self.challenge_ok = True
-
-    def valid_input(self, pos):
+        self.challenge_failed_start = len(self.failed_keys)
+        self.challenge_valid_start = len(self.valid_keys)
+
+    def key_id(self, ngram, pattern):
+        key = (ngram, pattern)
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append((ngram_text(ngram), pattern))
+        return key_id
+
+    def valid_input(self, pos, timestamp=None):
+        now = monotonic_ns() if timestamp is None else timestamp
         if pos == 0:
-            self.before = perf_counter()
+            self.before = now
             return
-        now = perf_counter()
-        elapsed_time = now - self.before
+        elapsed_time = (now - self.before) / 1e9
         self.before = now
         self.total_time_per_char += elapsed_time
-        self.latency_per_char[pos] = elapsed_time
         self.valid_strokes += 1
-        if self.ok_chars[pos] is None:
-            self.ok_chars[pos] = True
-        if self.ok_including(pos):
-            self.valid_3grams[self.ngram_key(pos)] += 1
-            self.latency_3grams.append([self.ngram_key(pos), int(self.latency_at(pos) * 1000)])
-
-    def invalid_input(self, pos):
-        now = perf_counter()
-        self.total_time_per_char += now - self.before
+        if self.ok_chars[pos] == UNSET:
+            self.ok_chars[pos] = VALID_CHAR
+            self.ok_runs[pos] = self.ok_run(pos - 1) + 1
+        if self.ok_chars[pos] != VALID_CHAR:
+            return
+        run = self.ok_run(pos)
+        latency = int(elapsed_time * 1000)
+        position = pos * len(self.orders)
+        for order in self.orders:
+            if run < order:
+                break
+            self.valid_keys.append(self.challenge_keys[position])
+            self.valid_latencies.append(latency)
+            position += 1
+
+    def invalid_input(self, pos, timestamp=None):
+        now = monotonic_ns() if timestamp is None else timestamp
+        self.total_time_per_char += (now - self.before) / 1e9
         self.before = now
         self.invalid_strokes += 1
-        if self.ok_chars[pos] is None:
-            self.ok_chars[pos] = False
-        if self.ok_upto(pos):
-            self.failed_3grams[self.ngram_key(pos)] += 1
+        if self.ok_chars[pos] == UNSET:
+            self.ok_chars[pos] = FAILED_CHAR
+            self.ok_runs[pos] = 0
+        run = self.ok_run(pos - 1)
+        position = pos * len(self.orders)
+        for order in self.orders:
+            if run < order - 1:
+                break
+            self.failed_keys.append(self.challenge_keys[position])
+            position += 1
         self.challenge_ok = False
 
-    def ngram_key(self, pos):
-        return tuple([self.ngram_at(pos), self.generator_pattern])
-
-    def latency_upto(self, pos):
-        return self.latency_at(pos-2) + self.latency_at(pos-1) + self.latency_at(pos)
+    def challenge_statistics(self):
+        return ChallengeStatistics(
+            self.keys,
+            self.failed_keys[self.challenge_failed_start:],
+            self.valid_keys[self.challenge_valid_start:],
+            self.valid_latencies[self.challenge_valid_start:]
+        )
 
-    def latency_at(self, pos):
-        return self.latency_per_char[pos] if pos > 0 else 0
+    def rendered(self, elapsed):
+        self.total_render_time += elapsed
+        self.renders += 1
 
-    def ok_upto(self, pos):
-        return self.ok_at(pos-2) and self.ok_at(pos-1)
+    @property
+    def failed_3grams(self):
+        return Counter(self.keys[key_id] for key_id in self.failed_keys)
 
-    def ok_including(self, pos):
-        return self.ok_at(pos-2) and self.ok_at(pos-1) and self.ok_at(pos)
+    @property
+    def valid_3grams(self):
+        return Counter(self.keys[key_id] for key_id in self.valid_keys)
 
-    def ok_at(self, pos):
-        return self.ok_chars[pos] if pos > 0 else True
+    @property
+    def latency_3grams(self):
+        return [[self.keys[key_id], latency] for key_id, latency in zip(self.valid_keys, self.valid_latencies)]
 
-    def ngram_at(self, pos):
-        return tuple([self.at(pos - 2), self.at(pos - 1), self.at(pos)])
+    def ok_run(self, pos):
+        return self.ok_runs[pos] if pos > 0 else UNBROKEN
 
     def at(self, pos):
         return self.challenge_string[pos] if pos > 0 else "$"
@@ -88,7 +164,7 @@ class SessionStatistics:
     def print(self):
         print("Statistics")
         total_strokes = self.valid_strokes + self.invalid_strokes
-        worst_sequences = [f'"{"".join(ngram[0][0])}"' for ngram in self.failed_3grams.most_common(2)]
+        worst_sequences = [f'"{self.keys[key_id][0]}"' for key_id, _ in Counter(self.failed_keys).most_common(2)]
         worst_patterns = [f'"{"".join(pattern[0])}"' for pattern in self.failed_patterns.most_common(2)]
         rows = [
             [" Strokes per minute", "%.2f" % ((total_strokes * 60) / self.total_time_per_char)],
@@ -99,5 +175,14 @@ class SessionStatistics:
             [" Worst sequences", f"{', '.join(worst_sequences)}"],
             [" Worst patterns", f"{', '.join(worst_patterns)}"],
             [" Total time (s)", "%.2f" % self.total_time_per_char],
+            [" Render time per stroke (ms)", "%.3f" % (self.total_render_time / max(self.renders, 1) / 1e6)],
         ]
         print(tabulate(rows))
+
+
+def ngram_text(ngram):
+    chars = []
+    while ngram:
+        chars.append(chr((ngram & ((1 << CHAR_BITS) - 1)) - 1))
+        ngram >>= CHAR_BITS
+    return "".join(reversed(chars))
@@ -0,0 +1,92 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import gzip
+import heapq
+import json
+import os
+from itertools import groupby
+from operator import itemgetter
+
+SHARD_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+SHARD_LISTS = ["patterns", "words", "names"]
+
+
+def write_shard(directory, language, analysis):
+    os.makedirs(directory, exist_ok=True)
+    lists = {}
+    for name, counter in zip(SHARD_LISTS, [analysis.patterns, analysis.words, analysis.names]):
+        filename = f"{name}.jsonl.gz"
+        ranks = {element: rank for rank, element in enumerate(counter)}
+        with gzip.open(os.path.join(directory, filename), "wt", encoding="utf-8") as stream:
+            for element in sorted(counter):
+                stream.write(json.dumps([element, counter[element], ranks[element]]) + "\n")
+        lists[name] = {'filename': filename, 'entries': len(counter), 'total': counter.total()}
+    with open(os.path.join(directory, MANIFEST_FILENAME), "w") as stream:
+        json.dump({'version': SHARD_VERSION, 'language': language, 'lists': lists}, stream, indent=2)
+    counts = ", ".join(f"{info['entries']} {name}" for name, info in lists.items())
+    print(f"Wrote the counts of {counts} to {directory}")
+
+
+def merge(directories, output, bundle_size=None):
+    from code_hanon import analyzer
+
+    manifests = [read_manifest(directory) for directory in directories]
+    languages = {manifest['language'] for manifest in manifests}
+    if len(languages) > 1:
+        raise ValueError(f"the shards analyzed different languages ({', '.join(sorted(languages))})")
+    print(f'Merging {len(directories)} shards of {languages.pop()} files')
+
+    ranked_lists = []
+    for name, amount in analyzer.PRESENTED_LISTS:
+        entries = heapq.merge(*(
+            _read_entries(directory, manifest['lists'][name]['filename'], index)
+            for index, (directory, manifest) in enumerate(zip(directories, manifests))
+        ), key=itemgetter(0))
+        counts = (_merged(element, group) for element, group in groupby(entries, key=itemgetter(0)))
+        most_common = heapq.nlargest(max(amount, bundle_size or 0), counts, key=_priority)
+        total = sum(manifest['lists'][name]['total'] for manifest in manifests)
+        ranked_lists.append(([(element, count) for element, count, _ in most_common], total, 0))
+    analyzer.present_ranked(output, ranked_lists, bundle_size)
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILENAME)) as stream:
+        manifest = json.load(stream)
+    if manifest.get('version') != SHARD_VERSION:
+        raise ValueError(f"unsupported shard version {manifest.get('version')} in `{directory}`")
+    return manifest
+
+
+def _read_entries(directory, filename, index):
+    with gzip.open(os.path.join(directory, filename), "rt", encoding="utf-8") as stream:
+        for line in stream:
+            element, count, rank = json.loads(line)
+            yield element, count, (index, rank)
+
+
+def _merged(element, group):
+    count = 0
+    first = None
+    for _, partial_count, appearance in group:
+        count += partial_count
+        first = appearance if first is None else min(first, appearance)
+    return element, count, first
+
+
+def _priority(entry):
+    _, count, (index, rank) = entry
+    return count, -index, -rank
@@ -0,0 +1,257 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import struct
+import zlib
+from array import array
+from code_hanon import statistics_repository
+
+ARCHIVE_MAGIC = b"HANONSTA"
+ARCHIVE_VERSION = 2
+HEADER = struct.Struct("<8sI")
+BLOCK = struct.Struct("<BI")
+ROWS_HEADER = struct.Struct("<II")
+LENGTH = struct.Struct("<I")
+TOTAL = struct.Struct("<Q")
+SCHEMA, STRINGS, ROWS, END = range(4)
+BATCH_SIZE = 10000
+NULL = -(1 << 63)
+SESSION_TABLES = ["ngrams", "latencies"]
+SESSION_ROLLUPS = "session_rollups"
+ROLLUP_MERGES = {
+    'ngram_rollups': """
+        ok = ok + excluded.ok,
+        ko = ko + excluded.ko,
+        first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+        first_row = MIN(first_row, excluded.first_row)
+    """,
+    'latency_rollups': """
+        count = count + excluded.count,
+        total = total + excluded.total,
+        squares = squares + excluded.squares
+    """,
+}
+
+
+def export_statistics(filename):
+    tables = {
+        table['name']: [(column, kind == 'TEXT') for column, kind in table['columns'].items()]
+        for table in sorted(statistics_repository.DATABASE_TABLES, key=lambda table: table['name'] != SESSION_ROLLUPS)
+    }
+    codes = {}
+    rows = 0
+    connection = statistics_repository.connect()
+    with open(filename, "wb") as stream:
+        stream.write(HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+        schema = {table: [column for column, _ in columns] for table, columns in tables.items()}
+        _write_block(stream, SCHEMA, json.dumps(schema).encode())
+        for index, (table, columns) in enumerate(tables.items()):
+            cursor = connection.execute(f"SELECT {', '.join(schema[table])} FROM {table} ORDER BY rowid")
+            while batch := cursor.fetchmany(BATCH_SIZE):
+                encoded = []
+                new_strings = []
+                for position, (column, text) in enumerate(columns):
+                    values = (row[position] for row in batch)
+                    if text:
+                        values = (_code(codes, new_strings, value) for value in values)
+                    encoded.append(array('q', (NULL if value is None else value for value in values)))
+                if new_strings:
+                    _write_block(stream, STRINGS, b"".join(_encode_string(string) for string in new_strings))
+                payload = b"".join(column.tobytes() for column in encoded)
+                _write_block(stream, ROWS, ROWS_HEADER.pack(index, len(batch)) + payload)
+                rows += len(batch)
+        _write_block(stream, END, TOTAL.pack(rows))
+    connection.close()
+    return rows
+
+
+def import_statistics(filename):
+    connection = statistics_repository.connect()
+    with open(filename, "rb") as stream, connection:
+        magic, version = _read(stream, HEADER)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("not a statistics archive")
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"unsupported archive version {version}")
+        kind, payload = _read_block(stream)
+        if kind != SCHEMA:
+            raise ValueError("the archive does not start with a schema")
+        archive = StatisticsImport(connection, list(json.loads(payload).items()))
+        while (block := _read_block(stream))[0] != END:
+            kind, payload = block
+            if kind == STRINGS:
+                archive.strings.extend(_decode_strings(payload))
+            elif kind == ROWS:
+                archive.rows(payload)
+            else:
+                raise ValueError(f"unexpected block type {kind}")
+        archive.merge_sessions()
+        (exported,) = TOTAL.unpack(block[1])
+    connection.close()
+    return exported, archive.imported, archive.mixed_days
+
+
+class StatisticsImport:
+    def __init__(self, connection, schema):
+        self.connection = connection
+        self.schema = schema
+        self.tables = {table['name']: table['columns'] for table in statistics_repository.DATABASE_TABLES}
+        self.strings = []
+        self.imported = 0
+        self.mixed_days = 0
+        self.sessions_merged = False
+        connection.execute("CREATE TEMP TABLE skipped_sessions (timestamp INTEGER PRIMARY KEY)")
+        connection.execute(
+            "INSERT OR IGNORE INTO skipped_sessions (timestamp) "
+            + " UNION ".join(
+                f"SELECT timestamp FROM {table} WHERE timestamp IS NOT NULL"
+                for table in SESSION_TABLES + [SESSION_ROLLUPS]
+            )
+        )
+        self.columns = {
+            table: _known_columns(self.tables[table], columns) for table, columns in schema if table in self.tables
+        }
+        self.columns.setdefault(SESSION_ROLLUPS, list(self.tables[SESSION_ROLLUPS]))
+        for table, columns in self.columns.items():
+            connection.execute(
+                f"CREATE TEMP TABLE imported_{table} AS SELECT {', '.join(columns)} FROM {table} WHERE false"
+            )
+
+    def rows(self, payload):
+        index, count = ROWS_HEADER.unpack_from(payload)
+        table, columns = self.schema[index]
+        values = array('q')
+        values.frombytes(payload[ROWS_HEADER.size:])
+        if len(values) != count * len(columns):
+            raise ValueError("damaged archive")
+        if table not in self.tables:
+            return
+        if table == SESSION_ROLLUPS and self.sessions_merged:
+            raise ValueError("session rollups found after the rest of the statistics")
+        if table != SESSION_ROLLUPS:
+            self.merge_sessions()
+        local_columns = self.tables[table]
+        decoded = []
+        for position, column in enumerate(columns):
+            if column in local_columns:
+                text = local_columns[column] == 'TEXT'
+                decoded.append([
+                    None if value == NULL else self.strings[value] if text else value
+                    for value in values[position * count:(position + 1) * count]
+                ])
+        column_list = ', '.join(self.columns[table])
+        self.connection.executemany(
+            f"INSERT INTO imported_{table} ({column_list}) VALUES ({', '.join('?' * len(decoded))})", zip(*decoded)
+        )
+        if table == SESSION_ROLLUPS:
+            return
+        if table in SESSION_TABLES:
+            condition = "WHERE timestamp NOT IN skipped_sessions"
+        else:
+            condition = f"WHERE day IN new_days ON CONFLICT (ngram, pattern, day) DO UPDATE SET {ROLLUP_MERGES[table]}"
+        cursor = self.connection.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM imported_{table} {condition}"
+        )
+        self.connection.execute(f"DELETE FROM imported_{table}")
+        self.imported += cursor.rowcount
+
+    def merge_sessions(self):
+        if self.sessions_merged:
+            return
+        self.sessions_merged = True
+        connection = self.connection
+        connection.execute(
+            f"""
+            CREATE TEMP TABLE archived_days AS
+            SELECT date(timestamp, 'unixepoch') AS day, COUNT(*) AS sessions,
+                   SUM(timestamp IN skipped_sessions) AS known
+            FROM imported_{SESSION_ROLLUPS}
+            GROUP BY day
+            """
+        )
+        connection.execute("CREATE TEMP TABLE new_days AS SELECT day FROM archived_days WHERE known = 0")
+        self.mixed_days = connection.execute(
+            "SELECT COUNT(*) FROM archived_days WHERE known BETWEEN 1 AND sessions - 1"
+        ).fetchone()[0]
+        connection.execute(
+            f"""
+            INSERT OR IGNORE INTO skipped_sessions (timestamp)
+            SELECT timestamp FROM imported_{SESSION_ROLLUPS}
+            WHERE date(timestamp, 'unixepoch') NOT IN new_days
+            """
+        )
+        columns = ', '.join(self.columns[SESSION_ROLLUPS])
+        cursor = connection.execute(
+            f"""
+            INSERT INTO {SESSION_ROLLUPS} ({columns})
+            SELECT {columns} FROM imported_{SESSION_ROLLUPS}
+            WHERE timestamp NOT IN skipped_sessions
+            """
+        )
+        connection.execute(f"DROP TABLE imported_{SESSION_ROLLUPS}")
+        self.imported += cursor.rowcount
+
+
+def _known_columns(local_columns, columns):
+    return [column for column in columns if column in local_columns]
+
+
+def _code(codes, new_strings, value):
+    if value is None:
+        return None
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(codes)
+        new_strings.append(value)
+    return code
+
+
+def _encode_string(string):
+    data = str(string).encode()
+    return LENGTH.pack(len(data)) + data
+
+
+def _decode_strings(payload):
+    position = 0
+    while position < len(payload):
+        (length,) = LENGTH.unpack_from(payload, position)
+        position += LENGTH.size
+        yield payload[position:position + length].decode()
+        position += length
+
+
+def _write_block(stream, kind, payload):
+    payload = zlib.compress(payload)
+    stream.write(BLOCK.pack(kind, len(payload)))
+    stream.write(payload)
+
+
+def _read_block(stream):
+    kind, length = _read(stream, BLOCK)
+    payload = stream.read(length)
+    if len(payload) != length:
+        raise ValueError("truncated archive")
+    try:
+        return kind, zlib.decompress(payload)
+    except zlib.error:
+        raise ValueError("damaged archive")
+
+
+def _read(stream, structure):
+    data = stream.read(structure.size)
+    if len(data) != structure.size:
+        raise ValueError("truncated archive")
+    return structure.unpack(data)
@@ -14,46 +14,73 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import sys
-import itertools
-import statistics
-from collections import deque
+import numpy as np
 from tabulate import tabulate
+from code_hanon import latency_analysis
+from code_hanon import profiling
 from code_hanon import statistics_repository
 from sparklines import sparklines
 
 
-def moving_average(iterable, n=3):
-    it = iter(iterable)
-    d = deque(itertools.islice(it, n - 1))
-    d.appendleft(0)
-    s = sum(d)
-    for elem in it:
-        s += elem - d.popleft()
-        d.append(elem)
-        yield int(s / n)
+def present(sort='error_rate', profile=None, by_pattern=True, order=None):
+    with profiling.phase(profile, "query"):
+        statistics_repository.prepare()
+        summaries = statistics_repository.ngram_summaries(sort, by_pattern=by_pattern, order=order)
+    if len(summaries) == 0:
+        return
+
+    keys = [(summary['ngram'], summary['pattern'] if by_pattern else None) for summary in summaries]
+    with profiling.phase(profile, "query"):
+        codes, values = statistics_repository.latency_samples(keys, by_pattern)
+        moments = statistics_repository.latency_moments(keys, by_pattern)
+    with profiling.phase(profile, "aggregation"):
+        percentiles = latency_analysis.grouped_percentiles(codes, values, len(keys))
+        percentiles[np.bincount(np.asarray(codes), minlength=len(keys)) != np.asarray(moments[0])] = np.nan
+        variances = latency_analysis.variances(*moments)
+    rows = []
+    for summary, ngram_percentiles, variance in zip(summaries, percentiles, variances):
+        rows.append([
+            summary['pattern'] if by_pattern else f"{summary['patterns']} pattern{'s' if summary['patterns'] > 1 else ''}",
+            f"•{summary['ngram']}•",
+            summary['latency'],
+            format_percentiles(ngram_percentiles),
+            "%.0f" % variance,
+            f"{int(summary['error_rate'] * 100)}% ({summary['ko']}/{summary['total']})"
+        ])
+    with profiling.phase(profile, "rendering"):
+        print(tabulate([["Expression", "N-Gram", f"Latency (ms) {latency_sorted_column_indicator(sort)}", "p50/p95/p99 (ms)", "Variance", f"Error rate {error_sorted_column_indicator(sort)}"]] + rows, headers="firstrow", colalign=("right", "right", "right", "right", "right", "right")))
 
+    present_recent_patterns(profile, order)
 
-def present(sort='error_rate'):
-    [ngrams, latencies] = statistics_repository.all_statistics()
+    with profiling.phase(profile, "query"):
+        strokes_per_minute = statistics_repository.strokes_per_minute()
+    with profiling.phase(profile, "rendering"):
+        sys.stdout.write("SPM: ")
+        for dp in sparklines(strokes_per_minute):
+            print(dp)
 
-    ngram_statuses, strokes_per_minute = parse_statistics(latencies, ngrams)
-    ngrams_sorted = sort_ngrams(ngram_statuses, sort)
-    if len(ngrams_sorted) == 0:
+
+def present_recent_patterns(profile=None, order=None):
+    with profiling.phase(profile, "query"):
+        patterns, codes, values = statistics_repository.recent_pattern_samples(order=order)
+    if len(patterns) == 0:
         return
 
+    with profiling.phase(profile, "aggregation"):
+        percentiles = latency_analysis.grouped_percentiles(codes, values, len(patterns))
+        variances = latency_analysis.grouped_variances(codes, values, len(patterns))
+        slowest = np.argsort(-percentiles[:, 1], kind='stable')[:20]
     rows = []
-    for ngram_id in ngrams_sorted[:20]:
-        rows.append([
-            ngram_id[1],
-            f"•{ngram_id[0]}•",
-            ngram_statuses[ngram_id]['latency'],
-            f"{int(ngram_statuses[ngram_id]['error_rate'] * 100)}% ({ngram_statuses[ngram_id]['ko']}/{ngram_statuses[ngram_id]['ok'] + ngram_statuses[ngram_id]['ko']})"
-        ])
-    print(tabulate([["Expression", "N-Gram", f"Latency (ms) {latency_sorted_column_indicator(sort)}", f"Error rate {error_sorted_column_indicator(sort)}"]] + rows, headers="firstrow", colalign=("right", "right", "right", "right")))
+    for code in slowest:
+        rows.append([patterns[code], format_percentiles(percentiles[code]), "%.0f" % variances[code]])
+    with profiling.phase(profile, "rendering"):
+        print(tabulate([["Expression", "Recent p50/p95/p99 (ms) ▼", "Variance"]] + rows, headers="firstrow", colalign=("right", "right", "right")))
+
 
-    sys.stdout.write("SPM: ")
-    for dp in sparklines(strokes_per_minute[-20:]):
-        print(dp)
+def format_percentiles(percentiles):
+    if np.isnan(percentiles).any():
+        return "-"
+    return "/".join("%d" % value for value in percentiles)
 
 
 def latency_sorted_column_indicator(sort):
@@ -66,50 +93,3 @@ def error_sorted_column_indicator(sort):
     if sort == "error_rate":
         return "▼"
     return ""
-
-
-def sort_ngrams(ngram_statuses, sort):
-    ngrams_filtered = filter(lambda d: ngram_statuses[d]['total'] >= 3, ngram_statuses.keys())
-    ngrams_sorted = sorted(ngrams_filtered, key=lambda d: -ngram_statuses[d][sort])
-    return ngrams_sorted
-
-
-def parse_statistics(latencies, ngrams):
-    ngram_statuses = {}
-    for ngram in ngrams:
-        ngram_id = (ngram['ngram'], ngram['pattern'])
-        if ngram_id not in ngram_statuses:
-            ngram_statuses[ngram_id] = {'ok': 0, 'ko': 0, 'latencies': []}
-        if ngram['status'] == "OK":
-            ngram_statuses[ngram_id]['ok'] += int(ngram['value'])
-        if ngram['status'] == "KO":
-            ngram_statuses[ngram_id]['ko'] += int(ngram['value'])
-
-    for latency in latencies:
-        ngram_id = (latency['ngram'], latency['pattern'])
-        if ngram_id not in ngram_statuses:
-            ngram_statuses[ngram_id] = {'ok': 0, 'ko': 0, 'latencies': []}
-        ngram_statuses[ngram_id]['latencies'].append(latency['value'])
-
-    for _, ngram_stats in ngram_statuses.items():
-        ngram_stats['total'] = ngram_stats['ok'] + ngram_stats['ko']
-        ngram_stats['error_rate'] = float(ngram_stats['ko']) / (ngram_stats['total'])
-
-    for _, ngram_stats in ngram_statuses.items():
-        ngram_latencies = ngram_stats['latencies']
-        if len(ngram_latencies) == 0:
-            ngram_stats['latency'] = 0
-            continue
-        avg = list(moving_average(ngram_latencies, n=min(len(ngram_latencies), 3)))
-        ngram_stats['latency'] = avg[-1]
-
-    latency_per_timestamp = {}
-    for latency in latencies:
-        timestamp = latency['timestamp']
-        if timestamp not in latency_per_timestamp:
-            latency_per_timestamp[timestamp] = [latency['value']]
-        else:
-            latency_per_timestamp[timestamp].append(latency['value'])
-    strokes_per_minute = [int(60000 / statistics.mean(latency_per_timestamp[timestamp])) for timestamp in sorted(latency_per_timestamp.keys())]
-
-    return ngram_statuses, strokes_per_minute
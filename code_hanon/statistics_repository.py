@@ -13,8 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import queue
 import sqlite3
+import threading
 import time
+from array import array
+from collections import Counter
+from itertools import chain
 
 DATABASE_FILENAME = "statistics.db"
 FAILED = "KO"
@@ -28,7 +33,11 @@ DATABASE_TABLES = [
             'status': 'TEXT',
             'value': 'INTEGER DEFAULT 0',
             'timestamp': 'INTEGER',
-        }
+        },
+        'indexes': [
+            ['ngram', 'pattern'],
+            ['timestamp'],
+        ]
     },
     {
         'name': 'latencies',
@@ -37,9 +46,59 @@ DATABASE_TABLES = [
             'pattern': 'TEXT',
             'value': 'INTEGER DEFAULT 0',
             'timestamp': 'INTEGER',
-        }
+        },
+        'indexes': [
+            ['ngram', 'pattern', 'timestamp'],
+            ['timestamp'],
+        ]
+    },
+    {
+        'name': 'ngram_rollups',
+        'columns': {
+            'day': 'TEXT',
+            'ngram': 'TEXT',
+            'pattern': 'TEXT',
+            'ok': 'INTEGER DEFAULT 0',
+            'ko': 'INTEGER DEFAULT 0',
+            'first_timestamp': 'INTEGER',
+            'first_row': 'INTEGER',
+        },
+        'unique': [
+            ['ngram', 'pattern', 'day'],
+        ]
+    },
+    {
+        'name': 'latency_rollups',
+        'columns': {
+            'day': 'TEXT',
+            'ngram': 'TEXT',
+            'pattern': 'TEXT',
+            'count': 'INTEGER DEFAULT 0',
+            'total': 'INTEGER DEFAULT 0',
+            'squares': 'INTEGER DEFAULT 0',
+        },
+        'unique': [
+            ['ngram', 'pattern', 'day'],
+        ]
+    },
+    {
+        'name': 'session_rollups',
+        'columns': {
+            'timestamp': 'INTEGER',
+            'count': 'INTEGER DEFAULT 0',
+            'total': 'INTEGER DEFAULT 0',
+        },
+        'unique': [
+            ['timestamp'],
+        ]
     },
 ]
+RECENT_LATENCIES = 3
+RETENTION_DAYS = 7
+SORT_COLUMNS = ['error_rate', 'latency']
+MINIMUM_SAMPLES = 3
+WRITER_QUEUE_SIZE = 64
+RECENT_SAMPLES = 200000
 
 
 def prepare():
@@ -53,7 +112,17 @@ def prepare():
                 f")"
             )
             for col, typ in table['columns'].items():
-                _add_column_if_not_exists(cursor, 'ngrams', col, typ)
+                _add_column_if_not_exists(cursor, table['name'], col, typ)
+            for columns in table.get('indexes', []):
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table['name']}_{'_'.join(columns)} "
+                    f"ON {table['name']}({','.join(columns)})"
+                )
+            for columns in table.get('unique', []):
+                cursor.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS {table['name']}_{'_'.join(columns)} "
+                    f"ON {table['name']}({','.join(columns)})"
+                )
 
 
 def _add_column_if_not_exists(cursor, table_name, column_name, column_type):
@@ -70,44 +139,93 @@ def _add_column_if_not_exists(cursor, table_name, column_name, column_type):
 
 
 def update_statistics(statistics):
-    connection = sqlite3.connect(DATABASE_FILENAME)
-    cursor = connection.cursor()
-    for ngram in statistics.failed_3grams.most_common():
-        _insert(cursor, ngram, FAILED)
-    for ngram in statistics.valid_3grams.most_common():
-        _insert(cursor, ngram, VALID)
-    for latency in statistics.latency_3grams:
-        _insert_latency(cursor, latency)
-    connection.commit()
+    connection = connect()
+    _write_statistics(connection, statistics, int(time.time()))
     connection.close()
 
 
-def _insert(cursor, element, status):
-    ngram_id = "".join(element[0][0])
-    if ngram_id.startswith("$$"):
-        return
-    pattern = element[0][1]
-    value = element[1]
-    timestamp = int(time.time())
-    cursor.execute(
-        f"INSERT INTO ngrams (ngram, pattern, status, value, timestamp) VALUES (?, ?, ?, ?, ?)",
-        [ngram_id, pattern, status, value, timestamp]
-    )
+class StatisticsWriter(threading.Thread):
+    def __init__(self, timestamp=None, capacity=WRITER_QUEUE_SIZE):
+        super().__init__(daemon=True)
+        self.timestamp = int(time.time()) if timestamp is None else timestamp
+        self.queue = queue.Queue(capacity)
+        self.error = None
+        self.finished = False
 
+    def write(self, statistics):
+        self.queue.put(statistics)
 
-def _insert_latency(cursor, latency):
-    ngram_id = "".join(latency[0][0])
-    if ngram_id.startswith("$$"):
-        return
-    pattern = latency[0][1]
-    value = latency[1]
-    timestamp = int(time.time())
-    if ngram_id.startswith("$$"):
-        return
-    cursor.execute(
-        f"INSERT INTO latencies (ngram, pattern, value, timestamp) VALUES (?, ?, ?, ?)",
-        [ngram_id, pattern, value, timestamp]
-    )
+    def run(self):
+        connection = connect()
+        try:
+            while (statistics := self.queue.get()) is not None:
+                if self.error is None:
+                    try:
+                        _write_statistics(connection, statistics, self.timestamp)
+                    except sqlite3.Error as error:
+                        self.error = error
+        finally:
+            connection.close()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _write_statistics(connection, statistics, timestamp):
+    keys = statistics.keys
+    with connection:
+        connection.executemany(
+            "INSERT INTO ngrams (ngram, pattern, status, value, timestamp) VALUES (?, ?, ?, ?, ?)",
+            chain(
+                _ngram_rows(keys, Counter(statistics.failed_keys).most_common(), FAILED, timestamp),
+                _ngram_rows(keys, Counter(statistics.valid_keys).most_common(), VALID, timestamp),
+            )
+        )
+        connection.executemany(
+            "INSERT INTO latencies (ngram, pattern, value, timestamp) VALUES (?, ?, ?, ?)",
+            _latency_rows(keys, statistics.valid_keys, statistics.valid_latencies, timestamp)
+        )
+
+
+def connect():
+    connection = sqlite3.connect(DATABASE_FILENAME)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def _ngram_rows(keys, counts, status, timestamp):
+    for key_id, value in counts:
+        ngram, pattern = keys[key_id]
+        if not ngram.startswith("$$"):
+            yield ngram, pattern, status, value, timestamp
+
+
+def _latency_rows(keys, key_ids, latencies, timestamp):
+    for key_id, value in zip(key_ids, latencies):
+        ngram, pattern = keys[key_id]
+        if not ngram.startswith("$$"):
+            yield ngram, pattern, value, timestamp
+
+
+def session_stored(timestamp):
+    connection = connect()
+    stored = connection.execute(
+        """
+        SELECT EXISTS (SELECT 1 FROM ngrams WHERE timestamp = :timestamp)
+            OR EXISTS (SELECT 1 FROM latencies WHERE timestamp = :timestamp)
+            OR EXISTS (SELECT 1 FROM session_rollups WHERE timestamp = :timestamp)
+        """,
+        {'timestamp': timestamp}
+    ).fetchone()[0]
+    connection.close()
+    return bool(stored)
 
 
 def all_statistics():
@@ -137,3 +255,283 @@ def all_statistics():
     } for row in rows]
 
     return [ngrams, latencies]
+
+
+def ngram_summaries(sort='error_rate', limit=20, by_pattern=True, order=None):
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"unknown sort column `{sort}`")
+    condition = "WHERE length(ngram) = :order" if order else ""
+    if by_pattern:
+        pattern, group, same_key = "pattern", "ngram, pattern", "AND latencies.pattern = totals.pattern"
+    else:
+        pattern, group, same_key = "COUNT(DISTINCT pattern) AS patterns", "ngram", ""
+    connection = connect()
+    connection.row_factory = sqlite3.Row
+    rows = connection.execute(
+        f"""
+        WITH combined AS (
+            SELECT ngram, pattern,
+                   CASE WHEN status = :valid THEN value ELSE 0 END AS ok,
+                   CASE WHEN status = :failed THEN value ELSE 0 END AS ko,
+                   timestamp AS first_timestamp,
+                   rowid AS first_row
+            FROM ngrams
+            {condition}
+            UNION ALL
+            SELECT ngram, pattern, ok, ko, first_timestamp, first_row FROM ngram_rollups {condition}
+        ),
+        totals AS (
+            SELECT ngram, {pattern}, SUM(ok) AS ok, SUM(ko) AS ko,
+                   MIN(first_timestamp) AS first_timestamp,
+                   MIN(first_row) AS first_row
+            FROM combined
+            GROUP BY {group}
+            HAVING SUM(ok) + SUM(ko) >= :minimum
+        )
+        SELECT *, ok + ko AS total,
+               CAST(ko AS REAL) / (ok + ko) AS error_rate,
+               COALESCE((
+                   SELECT CAST(AVG(value) AS INTEGER) FROM (
+                       SELECT value FROM latencies
+                       WHERE latencies.ngram = totals.ngram {same_key}
+                       ORDER BY timestamp DESC, rowid DESC
+                       LIMIT :recent
+                   )
+               ), 0) AS latency
+        FROM totals
+        ORDER BY {sort} DESC, first_timestamp, first_row
+        LIMIT :limit
+        """,
+        {
+            'valid': VALID, 'failed': FAILED, 'order': order, 'minimum': MINIMUM_SAMPLES,
+            'recent': RECENT_LATENCIES, 'limit': limit
+        }
+    ).fetchall()
+    connection.close()
+    return rows
+
+
+def weakest_ngrams(candidates, limit=200):
+    connection = connect()
+    connection.execute("CREATE TEMP TABLE candidates (ngram TEXT PRIMARY KEY)")
+    connection.executemany("INSERT INTO candidates (ngram) VALUES (?)", ((ngram,) for ngram in candidates))
+    rows = connection.execute(
+        """
+        WITH counts AS (
+            SELECT ngram,
+                   CASE WHEN status = ? THEN value ELSE 0 END AS ok,
+                   CASE WHEN status = ? THEN value ELSE 0 END AS ko
+            FROM ngrams
+            WHERE ngram IN candidates
+            UNION ALL
+            SELECT ngram, ok, ko FROM ngram_rollups WHERE ngram IN candidates
+        ),
+        totals AS (
+            SELECT ngram, SUM(ok) AS ok, SUM(ko) AS ko
+            FROM counts
+            GROUP BY ngram
+            HAVING SUM(ok) + SUM(ko) >= ?
+        ),
+        samples AS (
+            SELECT ngram, COUNT(*) AS count, SUM(value) AS total
+            FROM latencies
+            WHERE ngram IN candidates AND timestamp NOT IN (SELECT timestamp FROM session_rollups)
+            GROUP BY ngram
+            UNION ALL
+            SELECT ngram, count, total FROM latency_rollups WHERE ngram IN candidates
+        ),
+        latency AS (
+            SELECT ngram, CAST(SUM(total) AS REAL) / SUM(count) AS latency
+            FROM samples
+            GROUP BY ngram
+        )
+        SELECT ngram, (ko + 1.0) / (ok + ko + 2) * COALESCE(latency, 0) AS weakness
+        FROM totals JOIN latency USING (ngram)
+        ORDER BY weakness DESC
+        LIMIT ?
+        """,
+        (VALID, FAILED, MINIMUM_SAMPLES, limit)
+    ).fetchall()
+    connection.close()
+    return rows
+
+
+def latency_samples(keys, by_pattern=True):
+    connection = connect()
+    _create_keys_table(connection, keys)
+    rows = connection.execute(
+        f"""
+        SELECT keys.rowid - 1, value FROM keys JOIN latencies USING ({_key_columns(by_pattern)})
+        WHERE timestamp NOT IN (SELECT timestamp FROM session_rollups)
+        """
+    )
+    samples = array('q', chain.from_iterable(rows))
+    connection.close()
+    return samples[0::2], samples[1::2]
+
+
+def latency_moments(keys, by_pattern=True):
+    columns = _key_columns(by_pattern)
+    connection = connect()
+    _create_keys_table(connection, keys)
+    rows = connection.execute(
+        f"""
+        SELECT key, SUM(count), SUM(total), SUM(squares)
+        FROM (
+            SELECT keys.rowid - 1 AS key, COUNT(*) AS count, SUM(value) AS total, SUM(value * value) AS squares
+            FROM keys JOIN latencies USING ({columns})
+            WHERE timestamp NOT IN (SELECT timestamp FROM session_rollups)
+            GROUP BY key
+            UNION ALL
+            SELECT keys.rowid - 1, count, total, squares FROM keys JOIN latency_rollups USING ({columns})
+        )
+        GROUP BY key
+        """
+    )
+    counts, totals, squares = (array('d', [0.0]) * len(keys) for _ in range(3))
+    for key, count, total, square in rows:
+        counts[key], totals[key], squares[key] = count, total, square
+    connection.close()
+    return counts, totals, squares
+
+
+def _key_columns(by_pattern):
+    return "ngram, pattern" if by_pattern else "ngram"
+
+
+def _create_keys_table(connection, keys):
+    connection.execute("CREATE TEMP TABLE keys (ngram TEXT, pattern TEXT)")
+    connection.executemany("INSERT INTO keys (ngram, pattern) VALUES (?, ?)", keys)
+
+
+def recent_pattern_samples(limit=RECENT_SAMPLES, order=None):
+    condition = "AND length(ngram) = ?" if order else ""
+    connection = connect()
+    rows = connection.execute(
+        f"""
+        SELECT pattern, value FROM latencies
+        WHERE timestamp NOT IN (SELECT timestamp FROM session_rollups) {condition}
+        ORDER BY rowid DESC
+        LIMIT ?
+        """,
+        (order, limit) if order else (limit,)
+    ).fetchall()
+    connection.close()
+    patterns = {}
+    codes = array('q', (patterns.setdefault(pattern, len(patterns)) for pattern, _ in rows))
+    values = array('q', (value for _, value in rows))
+    return list(patterns), codes, values
+
+
+def strokes_per_minute(limit=20):
+    connection = connect()
+    rows = connection.execute(
+        """
+        WITH sessions AS (
+            SELECT timestamp, COUNT(*) AS count, SUM(value) AS total
+            FROM latencies
+            WHERE timestamp NOT IN (SELECT timestamp FROM session_rollups)
+            GROUP BY timestamp
+            UNION ALL
+            SELECT timestamp, count, total FROM session_rollups
+        )
+        SELECT CAST(60000 / (CAST(total AS REAL) / count) AS INTEGER)
+        FROM sessions
+        WHERE total > 0
+        ORDER BY timestamp DESC
+        LIMIT ?
+        """,
+        (limit,)
+    ).fetchall()
+    connection.close()
+    return [row[0] for row in reversed(rows)]
+
+
+def compact(days=RETENTION_DAYS, vacuum=True):
+    cutoff = int(time.time()) - days * 86400
+    connection = connect()
+    pending = connection.execute(
+        """
+        SELECT EXISTS (SELECT 1 FROM ngrams WHERE timestamp < :cutoff)
+            OR EXISTS (
+                SELECT 1 FROM latencies
+                WHERE timestamp < :cutoff AND timestamp NOT IN (SELECT timestamp FROM session_rollups)
+            )
+        """,
+        {'cutoff': cutoff}
+    ).fetchone()[0]
+    if not pending:
+        connection.close()
+        return
+    with connection:
+        connection.execute(
+            """
+            INSERT INTO ngram_rollups (day, ngram, pattern, ok, ko, first_timestamp, first_row)
+            SELECT date(timestamp, 'unixepoch') AS day, ngram, pattern,
+                   SUM(CASE WHEN status = ? THEN value ELSE 0 END),
+                   SUM(CASE WHEN status = ? THEN value ELSE 0 END),
+                   MIN(timestamp), MIN(rowid)
+            FROM ngrams
+            WHERE timestamp < ?
+            GROUP BY day, ngram, pattern
+            ON CONFLICT (ngram, pattern, day) DO UPDATE SET
+                ok = ok + excluded.ok,
+                ko = ko + excluded.ko,
+                first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+                first_row = MIN(first_row, excluded.first_row)
+            """,
+            (VALID, FAILED, cutoff)
+        )
+        connection.execute("DELETE FROM ngrams WHERE timestamp < ?", (cutoff,))
+        connection.execute(
+            """
+            CREATE TEMP TABLE compacted_latencies AS
+            SELECT rowid AS row, date(timestamp, 'unixepoch') AS day, ngram, pattern, value, timestamp
+            FROM latencies
+            WHERE timestamp < ? AND timestamp NOT IN (SELECT timestamp FROM session_rollups)
+            """,
+            (cutoff,)
+        )
+        connection.execute(
+            """
+            INSERT INTO latency_rollups (day, ngram, pattern, count, total, squares)
+            SELECT day, ngram, pattern, COUNT(*), SUM(value), SUM(value * value)
+            FROM compacted_latencies
+            WHERE true
+            GROUP BY day, ngram, pattern
+            ON CONFLICT (ngram, pattern, day) DO UPDATE SET
+                count = count + excluded.count,
+                total = total + excluded.total,
+                squares = squares + excluded.squares
+            """
+        )
+        connection.execute(
+            """
+            INSERT INTO session_rollups (timestamp, count, total)
+            SELECT timestamp, COUNT(*), SUM(value) FROM compacted_latencies GROUP BY timestamp
+            """
+        )
+        connection.execute("CREATE TEMP TABLE compacted_keys (ngram TEXT, pattern TEXT, PRIMARY KEY (ngram, pattern))")
+        connection.execute(
+            "INSERT OR IGNORE INTO compacted_keys (ngram, pattern) SELECT ngram, pattern FROM compacted_latencies"
+        )
+        connection.execute(
+            """
+            DELETE FROM latencies
+            WHERE rowid IN (
+                SELECT latencies.rowid FROM compacted_keys JOIN latencies USING (ngram, pattern)
+                WHERE latencies.timestamp < :cutoff AND latencies.rowid NOT IN (
+                    SELECT recent.rowid FROM latencies AS recent
+                    WHERE recent.ngram = compacted_keys.ngram AND recent.pattern = compacted_keys.pattern
+                    ORDER BY recent.timestamp DESC, recent.rowid DESC
+                    LIMIT :recent
+                )
+            )
+            """,
+            {'cutoff': cutoff, 'recent': RECENT_LATENCIES}
+        )
+        connection.execute("DROP TABLE compacted_keys")
+        connection.execute("DROP TABLE compacted_latencies")
+    if vacuum:
+        connection.execute("VACUUM")
+    connection.close()
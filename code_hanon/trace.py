@@ -0,0 +1,76 @@
+# Copyright (C) Jordi Sánchez 2024
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+from collections import namedtuple
+from code_hanon.practice_session import Challenge
+from code_hanon.session_statistics import NGRAM_ORDERS
+
+TRACE_VERSION = 1
+
+RecordedSession = namedtuple('RecordedSession', ['timestamp', 'orders', 'challenges', 'keys'])
+
+
+class TraceWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def session(self, timestamp, orders=NGRAM_ORDERS):
+        self._write({"event": "session", "version": TRACE_VERSION, "timestamp": timestamp, "orders": list(orders)})
+
+    def challenge(self, challenge):
+        self._write({
+            "event": "challenge",
+            "pattern": challenge.pattern,
+            "string": challenge.string,
+            "display_string": challenge.display_string
+        })
+
+    def key(self, char, timestamp):
+        self._write({"event": "key", "char": char, "timestamp": timestamp})
+
+    def _write(self, event):
+        self.stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+class RecordedKeys:
+    def __init__(self, keys):
+        self.keys = iter(keys)
+
+    def read(self):
+        return next(self.keys, ("\x03", 0))
+
+
+def read_sessions(stream):
+    session = None
+    for number, line in enumerate(stream, 1):
+        try:
+            event = json.loads(line)
+            if event["event"] == "session":
+                if event["version"] != TRACE_VERSION:
+                    raise ValueError(f"unsupported trace version {event['version']}")
+                if session:
+                    yield session
+                session = RecordedSession(event["timestamp"], event.get("orders", NGRAM_ORDERS), [], [])
+            elif session is None:
+                raise ValueError("the trace does not start with a session")
+            elif event["event"] == "challenge":
+                session.challenges.append(Challenge(event["pattern"], event["string"], event["display_string"]))
+            elif event["event"] == "key":
+                session.keys.append((event["char"], event["timestamp"]))
+        except (ValueError, KeyError, TypeError) as error:
+            raise ValueError(f"line {number}: {error}")
+    if session:
+        yield session
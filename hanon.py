@@ -16,23 +16,26 @@
 
 import argparse
 import sys
-import yaml
-from code_hanon import analyzer
-from code_hanon import languages
-from code_hanon import practice
-from code_hanon import statistics_presenter
 
+CONFIG_FILENAME = "config.yml"
+CONFIGURED_COMMANDS = ["practice"]
 
-def print_help():
+
+def print_help(argv=None, config=None):
     help_text = 'Usage: code-hanon <command> [args]'
     help_text += '\n\nAvailable commands:'
     help_text += f'\n\t{"analyze":<20} Analyze a codebase and extract generator patterns'
+    help_text += f'\n\t{"merge":<20} Merge the analysis shards of several hosts into a single set of exercises'
     help_text += f'\n\t{"practice":<20} Practice coding using generator patterns'
+    help_text += f'\n\t{"replay":<20} Replay recorded practice sessions into the statistics without a terminal'
     help_text += f'\n\t{"stats":<20} Show your performance statistics'
+    help_text += f'\n\t{"compact":<20} Roll up old statistics to keep the statistics database small'
     print(help_text)
 
 
 def analyze(argv, config):
+    from code_hanon import languages
+
     options = argparse.ArgumentParser(description='analyze frequency of code patterns by line')
     options.add_argument(
         '-l', '--language',
@@ -45,11 +48,89 @@ def analyze(argv, config):
         action='store',
         help="output directory where to leave the analysis result files (exercises.txt, words.txt and names.txt)"
     )
+    options.add_argument(
+        '-j', '--jobs',
+        default=1,
+        type=int,
+        action='store',
+        help="number of worker processes used to analyze the files"
+    )
+    options.add_argument(
+        '-x', '--exclude',
+        default=[],
+        action='append',
+        help="name of a directory to skip, in addition to .git, node_modules and build (can be repeated)"
+    )
+    options.add_argument(
+        '--gitignore',
+        action='store_true',
+        help="skip the files and directories ignored by the .gitignore files of the analyzed directories"
+    )
+    options.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help="analyze every file again instead of reusing the results cached in the output directory"
+    )
+    options.add_argument(
+        '-m', '--max-entries',
+        default=None,
+        type=int,
+        action='store',
+        help="keep at most this amount of distinct words and names in memory, with approximate counts and no cache"
+    )
+    options.add_argument(
+        '-b', '--bundle-size',
+        default=None,
+        type=int,
+        action='store',
+        help="amount of patterns, words and names written to the exercise bundle (by default, the same as the lists)"
+    )
+    options.add_argument(
+        '-s', '--emit-shard',
+        default=None,
+        action='store',
+        help="write the exact counts of every pattern, word and name to this directory, to be combined with `merge`"
+    )
+    add_profile_options(options)
     options.add_argument('directories', nargs=argparse.REMAINDER)
 
     args = options.parse_args(argv)
+    if args.emit_shard and args.max_entries:
+        options.error("--emit-shard needs exact counts and cannot be used with --max-entries")
 
-    analyzer.analyze(args.language, args.directories, args.output)
+    from code_hanon import analyzer, profiling
+    with profiling.profiling(args.profile, args.profile_output) as profile:
+        analyzer.analyze(
+            args.language, args.directories, args.output, args.jobs, args.exclude, args.gitignore, args.cache,
+            args.max_entries, profile, args.bundle_size, args.emit_shard
+        )
+
+
+def merge_shards(argv, config):
+    options = argparse.ArgumentParser(description='combine the shards written by `analyze --emit-shard`')
+    options.add_argument(
+        '-o', '--output',
+        default="exercises",
+        action='store',
+        help="output directory where to leave the merged result files (exercises.txt, words.txt and names.txt)"
+    )
+    options.add_argument(
+        '-b', '--bundle-size',
+        default=None,
+        type=int,
+        action='store',
+        help="amount of patterns, words and names written to the exercise bundle (by default, the same as the lists)"
+    )
+    options.add_argument('shards', nargs='+', help="shard directories, in the order their directories were analyzed")
+    args = options.parse_args(argv)
+
+    from code_hanon import shards
+    try:
+        shards.merge(args.shards, args.output, args.bundle_size)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"error while merging shards: {error}")
+        sys.exit(1)
 
 
 def start_practice(argv, config):
@@ -60,12 +141,35 @@ def start_practice(argv, config):
         action='store',
         help="input directory from which to read the generator files (exercises.txt, words.txt and names.txt)"
     )
+    options.add_argument(
+        '-r', '--record',
+        default=None,
+        action='store',
+        help="append the challenges and keystrokes of the session to this trace file, to be used with `replay`"
+    )
+    add_profile_options(options)
+    args = options.parse_args(argv)
+
+    from code_hanon import practice, profiling
+    with profiling.profiling(args.profile, args.profile_output) as profile:
+        practice.start(args.input_directory, config, profile, args.record)
+
+
+def replay_sessions(argv, config):
+    options = argparse.ArgumentParser(description='replay recorded practice sessions into the statistics')
+    add_profile_options(options)
+    options.add_argument('traces', nargs='+', help="trace files written by `practice --record`")
     args = options.parse_args(argv)
 
-    practice.start(args.input_directory, config)
+    from code_hanon import profiling, replay
+    with profiling.profiling(args.profile, args.profile_output) as profile:
+        replay.replay(args.traces, profile)
 
 
 def show_stats(argv, config):
+    if argv and argv[0] in STATS_COMMANDS:
+        return STATS_COMMANDS[argv[0]](argv[1:], config)
+
     options = argparse.ArgumentParser(description='show your current performance statistics')
     options.add_argument(
         '-s', '--sort-by',
@@ -74,17 +178,103 @@ def show_stats(argv, config):
         action='store',
         help="input directory from which to read the generator files (exercises.txt, words.txt and names.txt)"
     )
+    options.add_argument(
+        '-a', '--all-patterns',
+        action='store_true',
+        help="add up the statistics of each ngram over all the patterns it was typed in"
+    )
+    options.add_argument(
+        '-n', '--order',
+        default=None,
+        type=int,
+        action='store',
+        help="only show the ngrams of this length"
+    )
+    add_profile_options(options)
+
+    args = options.parse_args(argv)
+
+    from code_hanon import profiling, statistics_presenter
+    with profiling.profiling(args.profile, args.profile_output) as profile:
+        statistics_presenter.present(args.sort_by, profile, not args.all_patterns, args.order)
+
+
+def export_stats(argv, config):
+    options = argparse.ArgumentParser(description='export the whole statistics history to a compact archive file')
+    options.add_argument('archive', help="file where to write the statistics archive")
+    args = options.parse_args(argv)
+
+    from code_hanon import statistics_archive, statistics_repository
+    statistics_repository.prepare()
+    rows = statistics_archive.export_statistics(args.archive)
+    print(f"Exported {rows} rows to {args.archive}")
+
+
+def import_stats(argv, config):
+    options = argparse.ArgumentParser(description='add the statistics history of an archive to the statistics database')
+    options.add_argument('archive', help="statistics archive written by `stats export`")
+    args = options.parse_args(argv)
+
+    from code_hanon import statistics_archive, statistics_repository
+    statistics_repository.prepare()
+    try:
+        exported, imported, mixed_days = statistics_archive.import_statistics(args.archive)
+    except (OSError, ValueError) as error:
+        print(f"error while importing `{args.archive}`: {error}")
+        sys.exit(1)
+    print(f"Imported {imported} of {exported} rows, skipping the sessions already in the statistics")
+    if mixed_days:
+        print(
+            f"Skipped the sessions of {mixed_days} compacted days that mix sessions already in the statistics "
+            f"with new ones, since their summaries cannot be split"
+        )
+
+
+def compact_stats(argv, config):
+    from code_hanon import statistics_repository
+
+    options = argparse.ArgumentParser(description='roll up old statistics into daily summaries')
+    options.add_argument(
+        '-d', '--older-than',
+        default=statistics_repository.RETENTION_DAYS,
+        type=int,
+        action='store',
+        help="roll up the statistics of the sessions older than this amount of days"
+    )
 
     args = options.parse_args(argv)
 
-    statistics_presenter.present(args.sort_by)
+    statistics_repository.prepare()
+    statistics_repository.compact(args.older_than)
+
+
+def add_profile_options(options):
+    options.add_argument(
+        '--profile',
+        action='store_true',
+        help="print how long each phase of the command took once it finishes"
+    )
+    options.add_argument(
+        '--profile-output',
+        default=None,
+        action='store',
+        help="with --profile, also write cProfile statistics to this file, readable with pstats"
+    )
+
 
+STATS_COMMANDS = {
+    "export": export_stats,
+    "import": import_stats
+}
 
 COMMANDS = {
     "help": print_help,
     "analyze": analyze,
+    "merge": merge_shards,
     "practice": start_practice,
-    "stats": show_stats
+    "replay": replay_sessions,
+    "stats": show_stats,
+    "compact": compact_stats
 }
 
 
@@ -96,17 +286,23 @@ def main():
         print_help()
         sys.exit(0)
 
-    with open("config.yml") as stream:
-        try:
-            config = yaml.safe_load(stream)
-        except yaml.YAMLError as exc:
-            print(exc)
-
     command_to_execute = args.command[0]
     command_arguments = args.command[1:]
+    config = load_config() if command_to_execute in CONFIGURED_COMMANDS else {}
     COMMANDS[command_to_execute](command_arguments, config.get(command_to_execute, {}))
 
 
+def load_config():
+    import yaml
+
+    with open(CONFIG_FILENAME) as stream:
+        try:
+            return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+        except yaml.YAMLError as exc:
+            print(exc)
+            sys.exit(1)
+
+
 def argument_parser():
     top_level_parser = argparse.ArgumentParser(description='hanon: ')
     top_level_parser.add_argument('command',